@@ -0,0 +1,181 @@
+import argparse
+import math
+
+from peewee import fn
+
+from db_manager import connect_db, create_tables, close_db
+from models import Anime, Season, Episode, EpisodeIndex
+
+
+def list_anime(page=1, per_page=20):
+    """
+    List the scraped anime with the number of their seasons and episodes.
+
+    :param page: Page number, starting at 1.
+    :param per_page: Number of anime per page.
+    :return: A tuple (anime, total) of the Anime model instances on the page, with
+             `season_count` and `episode_count` attributes, and the total number of anime.
+    """
+    season_count = Season.select(fn.COUNT(Season.id)).where(Season.anime == Anime.id)
+    episode_count = Episode.select(fn.COUNT(Episode.id)).join(Season).where(Season.anime == Anime.id)
+
+    query = Anime.select(
+        Anime,
+        season_count.alias('season_count'),
+        episode_count.alias('episode_count'),
+    ).order_by(Anime.anime_name)
+
+    return list(query.paginate(page, per_page)), Anime.select().count()
+
+
+def filter_episodes(query, anime_name=None, season_number=None, resolution=None, file_format=None, missing=False):
+    """
+    Apply the catalog filters to a query over episodes joined with their season and anime.
+
+    :param query: A select query over Episode, joined with Season and Anime.
+    :param anime_name: (Optional) Anime name, case-insensitive.
+    :param season_number: (Optional) Season number.
+    :param resolution: (Optional) Resolution, e.g. '1280x720'.
+    :param file_format: (Optional) File format, e.g. 'mp4'.
+    :param missing: If True, only keep the episodes that don't have a download URL yet.
+    :return: The filtered query.
+    """
+    if anime_name:
+        query = query.where(Anime.anime_name ** anime_name)
+    if season_number is not None:
+        query = query.where(Season.season_number == season_number)
+    if resolution:
+        query = query.where(Episode.resolution == resolution)
+    if file_format:
+        query = query.where(Episode.file_format == file_format)
+    if missing:
+        query = query.where(Episode.episode_url.is_null())
+    return query
+
+
+def list_episodes(page=1, per_page=50, **filters):
+    """
+    List the scraped episodes ordered by anime, season and episode number.
+
+    :param page: Page number, starting at 1.
+    :param per_page: Number of episodes per page.
+    :param filters: Keyword arguments of `filter_episodes`.
+    :return: A tuple (episodes, total) of the Episode model instances on the page and the
+             total number of matching episodes.
+    """
+    query = filter_episodes(Episode.select(Episode, Season, Anime).join(Season).join(Anime), **filters)
+    ordered = query.order_by(Anime.anime_name, Season.season_number, Episode.episode_number)
+    return list(ordered.paginate(page, per_page)), query.count()
+
+
+def to_match_query(text):
+    """
+    Turn user input into an FTS5 query that matches episodes containing all of its terms.
+    Each term is quoted as a phrase, so punctuation and keywords like AND are searched as text.
+
+    :param text: The search text.
+    :return: The FTS5 query or None if the text has no terms.
+    """
+    terms = text.split()
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_episodes(text, page=1, per_page=50, **filters):
+    """
+    Full-text search over the episode names and file names, best matches first.
+
+    :param text: The search text.
+    :param page: Page number, starting at 1.
+    :param per_page: Number of episodes per page.
+    :param filters: Keyword arguments of `filter_episodes`.
+    :return: A tuple (episodes, total) of the Episode model instances on the page and the
+             total number of matching episodes.
+    """
+    match_query = to_match_query(text)
+    if match_query is None:
+        return [], 0
+
+    query = (
+        Episode.select(Episode, Season, Anime)
+        .join(EpisodeIndex, on=(EpisodeIndex.rowid == Episode.id))
+        .switch(Episode).join(Season).join(Anime)
+        .where(EpisodeIndex.match(match_query))
+    )
+    query = filter_episodes(query, **filters)
+    ordered = query.order_by(EpisodeIndex.rank())
+    return list(ordered.paginate(page, per_page)), query.count()
+
+
+def print_page(page, per_page, total):
+    """Print the position of the current page."""
+    pages = max(math.ceil(total / per_page), 1)
+    print(f"\nPage {page} of {pages} ({total} total)")
+
+
+def print_episodes(episodes):
+    """Print one line per episode."""
+    for episode in episodes:
+        download = "yes" if episode.episode_url else "missing"
+        print(
+            f"{episode.season.anime.anime_name} | Season {episode.season.season_number} | "
+            f"Episode {episode.episode_number}: {episode.episode_name} | {episode.file_format} | "
+            f"{episode.resolution} | {episode.episode_size} | download: {download}"
+        )
+
+
+def positive_int(value):
+    """Parse a command line argument that must be an integer of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def get_arguments(args=None):
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description="Query the local catalog of scraped anime.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    anime_parser = commands.add_parser("anime", help="List the scraped anime.")
+    anime_parser.add_argument("--page", type=positive_int, default=1)
+    anime_parser.add_argument("--per-page", type=positive_int, default=20)
+
+    episodes_parser = commands.add_parser("episodes", help="List the scraped episodes.")
+    search_parser = commands.add_parser("search", help="Search the episode names and file names.")
+    search_parser.add_argument("text")
+
+    for command_parser in (episodes_parser, search_parser):
+        command_parser.add_argument("--anime", dest="anime_name")
+        command_parser.add_argument("--season", dest="season_number", type=int)
+        command_parser.add_argument("--resolution")
+        command_parser.add_argument("--format", dest="file_format")
+        command_parser.add_argument("--missing", action="store_true", help="Only episodes without a download URL.")
+        command_parser.add_argument("--page", type=positive_int, default=1)
+        command_parser.add_argument("--per-page", type=positive_int, default=50)
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = vars(get_arguments())
+    command = arguments.pop("command")
+
+    connect_db()
+    create_tables()
+
+    if command == "anime":
+        anime_items, total = list_anime(**arguments)
+        for anime in anime_items:
+            print(f"{anime.anime_name} | {anime.season_count} seasons | {anime.episode_count} episodes")
+    elif command == "episodes":
+        episodes, total = list_episodes(**arguments)
+        print_episodes(episodes)
+    else:
+        episodes, total = search_episodes(**arguments)
+        print_episodes(episodes)
+
+    print_page(arguments["page"], arguments["per_page"], total)
+
+    close_db()
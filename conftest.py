@@ -0,0 +1,12 @@
+import pytest
+
+from db_manager import db, create_tables, close_db
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Point the models at a new database file in a temporary directory."""
+    db.init(str(tmp_path / "anime_database.db"))
+    create_tables()
+    yield db
+    close_db()
@@ -1,11 +1,20 @@
-import peewee
-from models import Anime, Season, Episode
+from models import BaseModel, Anime, Season, Episode, EpisodeIndex, Job
 
 # Import DoesNotExist exception from peewee
 from peewee import DoesNotExist
 
-# Connect to the SQLite database
-db = peewee.SqliteDatabase('anime_database.db')
+# Connect to the SQLite database, using the same connection as the models
+db = BaseModel._meta.database
+
+# Version of the schema created by `create_tables`, stored in the database file.
+# Increase it whenever a model, index or trigger changes, so that existing databases are upgraded.
+SCHEMA_VERSION = 3
+
+# Per-run identity map of the seasons and episodes of preloaded anime.
+# Lookups for a preloaded anime are served from these dicts instead of the database.
+preloaded_anime_ids = set()
+season_cache = {}  # (anime id, season number) -> Season
+episode_cache = {}  # (season id, episode number) -> Episode
 
 
 def connect_db():
@@ -16,12 +25,105 @@ def connect_db():
 def close_db():
     """Close the database connection."""
     db.close()
+    clear_cache()
+
+
+def preload_anime(anime):
+    """
+    Load all the seasons and episodes of an anime into the identity map,
+    with one query per table.
+    """
+    seasons = {season.id: season for season in Season.select().where(Season.anime == anime)}
+    for season in seasons.values():
+        season.anime = anime
+        season_cache[(anime.id, season.season_number)] = season
+
+    episodes = list(Episode.select().join(Season).where(Season.anime == anime))
+    for episode in episodes:
+        episode.season = seasons[episode.season_id]
+        episode_cache[(episode.season_id, episode.episode_number)] = episode
+
+    preloaded_anime_ids.add(anime.id)
+    print(f"Loaded {len(seasons)} seasons and {len(episodes)} episodes of anime '{anime.anime_name}' from the database.")
+
+
+def clear_cache():
+    """Empty the identity map."""
+    preloaded_anime_ids.clear()
+    season_cache.clear()
+    episode_cache.clear()
 
 
 def create_tables():
-    """Create all the tables based on defined models."""
-    with db:
-        db.create_tables([Anime, Season, Episode])
+    """
+    Create all the tables based on defined models. Databases already at the current
+    schema version are left as they are, which only costs a single PRAGMA query.
+    Databases with a newer schema version are never downgraded.
+    """
+    version = db.pragma('user_version')
+    if version >= SCHEMA_VERSION:
+        if version > SCHEMA_VERSION:
+            print(f"The database has a newer schema version ({version}) than this code ({SCHEMA_VERSION}).")
+        return
+
+    # Several processes may start at the same time, so the version is read again
+    # once the write lock is held, and only the first of them upgrades the schema
+    with db.atomic('IMMEDIATE'):
+        if db.pragma('user_version') >= SCHEMA_VERSION:
+            return
+        db.create_tables([Anime, Season, Episode, Job])
+        migrate_tables()
+        create_search_index()
+        db.pragma('user_version', SCHEMA_VERSION)
+
+
+def migrate_tables():
+    """Add the columns of fields added to the models after their tables were created."""
+    # Only needed when upgrading a database, so it isn't imported on every start
+    from playhouse.migrate import SqliteMigrator, migrate
+
+    migrator = SqliteMigrator(db)
+    for model in [Anime, Season, Episode, Job]:
+        table_name = model._meta.table_name
+        columns = {column.name for column in db.get_columns(table_name)}
+        operations = [
+            migrator.add_column(table_name, field.column_name, field)
+            for field in model._meta.sorted_fields
+            if field.column_name not in columns
+        ]
+        if operations:
+            migrate(*operations)
+            print(f"Added {len(operations)} column(s) to table '{table_name}'.")
+
+
+def create_search_index():
+    """
+    Create the full-text index of the episodes and the triggers that keep it in sync.
+    The index is built from the existing episodes when it's first created.
+    """
+    is_new = not EpisodeIndex.table_exists()
+    EpisodeIndex.create_table()
+
+    db.execute_sql(
+        "CREATE TRIGGER IF NOT EXISTS episode_index_insert AFTER INSERT ON episode BEGIN "
+        "INSERT INTO episode_index (rowid, episode_name, file_name) "
+        "VALUES (new.id, new.episode_name, new.file_name); END;"
+    )
+    db.execute_sql(
+        "CREATE TRIGGER IF NOT EXISTS episode_index_delete AFTER DELETE ON episode BEGIN "
+        "INSERT INTO episode_index (episode_index, rowid, episode_name, file_name) "
+        "VALUES ('delete', old.id, old.episode_name, old.file_name); END;"
+    )
+    db.execute_sql(
+        "CREATE TRIGGER IF NOT EXISTS episode_index_update AFTER UPDATE OF episode_name, file_name ON episode BEGIN "
+        "INSERT INTO episode_index (episode_index, rowid, episode_name, file_name) "
+        "VALUES ('delete', old.id, old.episode_name, old.file_name); "
+        "INSERT INTO episode_index (rowid, episode_name, file_name) "
+        "VALUES (new.id, new.episode_name, new.file_name); END;"
+    )
+
+    if is_new:
+        EpisodeIndex.rebuild()
 
 
 def add_anime(anime_name, anime_link):
@@ -38,13 +140,21 @@ def add_anime(anime_name, anime_link):
 
 
 def add_season(anime, season_number, season_url, season_folder_path):
-    """Add a new season for an anime to the database."""
-    season, created = Season.get_or_create(
-        anime=anime,
-        season_number=season_number,
-        season_url=season_url,
-        season_folder_path=season_folder_path
-    )
+    """
+    Add a new season for an anime to the database. If the season already exists, the
+    instance in the identity map (or the stored row) is returned instead.
+    """
+    key = (anime.id, season_number)
+    season = season_cache.get(key)
+    created = False
+    if season is None:
+        season, created = Season.get_or_create(
+            anime=anime,
+            season_number=season_number,
+            defaults={"season_url": season_url, "season_folder_path": season_folder_path},
+        )
+        season.anime = anime
+        season_cache[key] = season
     if created:
         print(f"Season {season_number} added for anime '{anime.anime_name}'.")
     else:
@@ -53,20 +163,33 @@ def add_season(anime, season_number, season_url, season_folder_path):
 
 
 def add_episode(season, episode_number, episode_name=None, file_name=None, episode_size=None,
-                duration=None, file_format=None, resolution=None, episode_url=None, episode_folder_path=None):
-    """Add a new episode to a specific season."""
-    episode, created = Episode.get_or_create(
-        season=season,
-        episode_number=episode_number,
-        episode_name=episode_name,
-        file_name=file_name,
-        episode_size=episode_size,
-        duration=duration,
-        file_format=file_format,
-        resolution=resolution,
-        episode_url=episode_url,
-        episode_folder_path=episode_folder_path
-    )
+                duration=None, file_format=None, resolution=None, episode_url=None, episode_info_url=None,
+                episode_folder_path=None):
+    """
+    Add a new episode to a specific season. If the episode already exists, the instance
+    in the identity map (or the stored row) is returned instead.
+    """
+    key = (season.id, episode_number)
+    episode = episode_cache.get(key)
+    created = False
+    if episode is None:
+        episode, created = Episode.get_or_create(
+            season=season,
+            episode_number=episode_number,
+            defaults={
+                "episode_name": episode_name,
+                "file_name": file_name,
+                "episode_size": episode_size,
+                "duration": duration,
+                "file_format": file_format,
+                "resolution": resolution,
+                "episode_url": episode_url,
+                "episode_info_url": episode_info_url,
+                "episode_folder_path": episode_folder_path,
+            },
+        )
+        episode.season = season
+        episode_cache[key] = episode
     if created:
         print(f"Episode {episode_number} added to season {season.season_number} of anime '{season.anime.anime_name}'.")
     else:
@@ -75,6 +198,14 @@ def add_episode(season, episode_number, episode_name=None, file_name=None, episo
     return episode
 
 
+def update_season(season, **kwargs):
+    """Update a season's details."""
+    for field, value in kwargs.items():
+        setattr(season, field, value)
+    season.save()
+    print(f"Season {season.season_number} updated successfully.")
+
+
 def update_episode(episode, **kwargs):
     """Update an episode's details."""
     for field, value in kwargs.items():
@@ -102,8 +233,13 @@ def get_anime_by_name(anime_name):
 
 def get_season_by_anime_and_number(anime, season_number):
     """Retrieve a season by anime and season number."""
+    key = (anime.id, season_number)
+    if key in season_cache or anime.id in preloaded_anime_ids:
+        return season_cache.get(key)
+
     try:
         season = Season.get(Season.anime == anime, Season.season_number == season_number)
+        season_cache[key] = season
         return season
     except DoesNotExist:
         if season_number:
@@ -113,8 +249,13 @@ def get_season_by_anime_and_number(anime, season_number):
 
 def get_episode_by_season_and_number(season, episode_number):
     """Retrieve an episode by season and episode number."""
+    key = (season.id, episode_number)
+    if key in episode_cache or season.anime_id in preloaded_anime_ids:
+        return episode_cache.get(key)
+
     try:
         episode = Episode.get(Episode.season == season, Episode.episode_number == episode_number)
+        episode_cache[key] = episode
         return episode
     except DoesNotExist:
         if episode_number:
@@ -122,6 +263,15 @@ def get_episode_by_season_and_number(season, episode_number):
         return None
 
 
+def get_episodes_by_season(season):
+    """Retrieve all the episodes of a season, ordered by episode number."""
+    if season.anime_id in preloaded_anime_ids:
+        episodes = [episode for (season_id, _), episode in episode_cache.items() if season_id == season.id]
+        return sorted(episodes, key=lambda episode: episode.episode_number)
+
+    return list(Episode.select().where(Episode.season == season).order_by(Episode.episode_number))
+
+
 if __name__ == "__main__":
     # Example Usage:
     connect_db()
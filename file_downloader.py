@@ -1,20 +1,22 @@
 import os
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 
 
 class FileDownloader:
-    def __init__(self, retries=3, timeout=10, max_workers=4):
+    def __init__(self, retries=3, timeout=10, max_workers=4, media_processor=None):
         """
         Initialize the downloader.
         :param retries: Number of retry attempts for failed downloads.
         :param timeout: Timeout for each request in seconds.
         :param max_workers: Maximum number of parallel downloads.
+        :param media_processor: Optional MediaProcessor that each downloaded file is submitted to.
         """
         self.retries = retries
         self.timeout = timeout
         self.max_workers = max_workers
+        self.media_processor = media_processor
 
     def get_download_confirmation():
         """
@@ -55,19 +57,24 @@ class FileDownloader:
         except Exception as e:
             print(f"Error creating folder {folder_path}: {e}")
 
-    def download_file(self, episode):
+    def download_file(self, episode, abort=None):
         """
         Download a single episode file with support for resuming partial downloads.
         :param episode: Episode object containing episode details.
+        :param abort: Optional threading.Event that stops the download when set. The partial
+                      file is kept, so the download can be resumed later.
         """
         try:
             # Create folder if it doesn't exist
             self.create_folder(episode.episode_folder_path)
 
             # Construct the target path for saving the episode file
-            episode_file_name_with_space = f"{episode.episode_number}_{episode.episode_name}.mp4"
-            episode_file_name = episode_file_name_with_space.replace(" ", "_")
-            target_path = os.path.join(episode.episode_folder_path, episode_file_name)
+            target_path = self.get_target_path(episode)
+
+            # A processed file may have been remuxed, so its size no longer matches the server's
+            if episode.is_processed and os.path.exists(target_path):
+                print(f"Skipping download, file already processed: {target_path}")
+                return True
 
             # Get the total size of the file from the server
             total_size = self.get_file_size(episode.episode_url)
@@ -78,6 +85,7 @@ class FileDownloader:
             # If the file is already fully downloaded, skip it
             if total_size and downloaded_size >= total_size:
                 print(f"Skipping download, file already complete: {target_path}")
+                self.process_file(episode, target_path)
                 return True
 
             headers = {"Range": f"bytes={downloaded_size}-"} if downloaded_size > 0 else {}
@@ -93,23 +101,50 @@ class FileDownloader:
                         unit_divisor=1024,
                 ) as bar:
                     for chunk in response.iter_content(chunk_size=8192):
+                        if abort is not None and abort.is_set():
+                            print(f"Download of {episode.episode_name} aborted.")
+                            return False
                         file.write(chunk)
                         bar.update(len(chunk))
 
+            self.process_file(episode, target_path)
             return True  # Success
         except Exception as e:
             print(f"Failed to download {episode.episode_name}. Error: {e}")
             return False  # Failure
 
+    def get_target_path(self, episode):
+        """
+        Get the path where an episode file is saved.
+        :param episode: Episode object containing episode details.
+        :return: The path of the episode file.
+        """
+        episode_file_name_with_space = f"{episode.episode_number}_{episode.episode_name}.mp4"
+        episode_file_name = episode_file_name_with_space.replace(" ", "_")
+        return os.path.join(episode.episode_folder_path, episode_file_name)
+
+    def process_file(self, episode, target_path):
+        """
+        Submit a downloaded file to the media processor, if there is one.
+        :param episode: Episode object containing episode details.
+        :param target_path: Path of the downloaded file.
+        """
+        if self.media_processor is not None:
+            self.media_processor.submit(episode, target_path)
+
     def download_episodes(self, episodes):
         """
         Download multiple episodes with support for parallelism.
         :param episodes: List of Episode objects to download.
         """
-        def download_task(episode):
-            return self.download_file(episode)
-
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            results = list(executor.map(download_task, episodes))
+            futures = [executor.submit(self.download_file, episode) for episode in episodes]
+
+            # Record the media information of the processed files while downloading the others
+            running = futures
+            while running:
+                _, running = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                if self.media_processor is not None:
+                    self.media_processor.save_completed()
 
-        return results
+        return [future.result() for future in futures]
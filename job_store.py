@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta, timezone
+
+from peewee import fn
+
+from db_manager import db
+from models import Job
+
+# Job kinds, one per unit of work
+SEASON_JOB = "season"  # Scrape the pages of a season
+EPISODE_DETAILS_JOB = "episode_details"  # Fetch the detail page of an episode found in listing mode
+DOWNLOAD_JOB = "download"  # Download the file of an episode
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def set_journal_mode(journal_mode):
+    """
+    Set the journal mode of the database file, which is kept until it's changed again.
+    'wal' lets workers on the same host read while one of them writes, but it needs
+    shared memory, so it doesn't work for workers on several hosts sharing the file over
+    a network filesystem. They need the default rollback journal, 'delete'.
+
+    :param journal_mode: 'wal' or 'delete'.
+    """
+    db.pragma('journal_mode', journal_mode)
+
+
+def utc_now():
+    """
+    Get the current time in UTC. Leases are stored in UTC, so that workers in different
+    time zones agree on when they expire.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue_job(kind, target_id, refresh=False):
+    """
+    Add a job to the store. Each unit of work has a single job, so enqueuing it again
+    does nothing unless `refresh` is set.
+
+    :param kind: The job kind.
+    :param target_id: ID of the Season or Episode the job works on.
+    :param refresh: If True, a finished or failed job is set back to pending.
+    :return: True if the job was added or set back to pending, False otherwise.
+    """
+    query = Job.insert(kind=kind, target_id=target_id, status=PENDING)
+    if refresh:
+        query = query.on_conflict(
+            conflict_target=[Job.kind, Job.target_id],
+            update={Job.status: PENDING, Job.attempts: 0, Job.error: None, Job.updated_at: datetime.now()},
+            where=(Job.status != RUNNING),
+        )
+    else:
+        query = query.on_conflict_ignore()
+
+    with db.atomic('IMMEDIATE'):
+        return query.as_rowcount().execute() > 0
+
+
+def claim_job(worker_id, kinds=None, lease_seconds=300, max_attempts=3):
+    """
+    Claim the oldest pending job, or a running job whose lease has expired because its
+    worker crashed or hung. Jobs that have used up their attempts are marked as failed.
+
+    :param worker_id: ID of the claiming worker.
+    :param kinds: (Optional) List of job kinds the worker handles.
+    :param lease_seconds: How long the job is reserved for the worker without a heartbeat.
+    :param max_attempts: Number of attempts after which a job is failed.
+    :return: The claimed Job model instance or None if there is no work.
+    """
+    while True:
+        now = utc_now()
+        with db.atomic('IMMEDIATE'):
+            query = Job.select().where(
+                (Job.status == PENDING) | ((Job.status == RUNNING) & (Job.lease_expires_at < now))
+            )
+            if kinds:
+                query = query.where(Job.kind.in_(kinds))
+            job = query.order_by(Job.id).first()
+            if job is None:
+                return None
+
+            if job.attempts >= max_attempts:
+                job.status = FAILED
+                job.worker_id = None
+                job.lease_expires_at = None
+                job.error = job.error or "Lease expired too many times."
+                job.updated_at = datetime.now()
+                job.save()
+                print(f"{job} has used up its {max_attempts} attempts.")
+                continue
+
+            job.status = RUNNING
+            job.worker_id = worker_id
+            job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+            job.attempts += 1
+            job.updated_at = datetime.now()
+            job.save()
+            return job
+
+
+def renew_lease(job, worker_id, lease_seconds=300):
+    """
+    Extend the lease of a running job.
+
+    :return: True if the worker still holds the lease, False if the job was reclaimed.
+    """
+    query = Job.update(lease_expires_at=utc_now() + timedelta(seconds=lease_seconds), updated_at=datetime.now()).where(
+        (Job.id == job.id) & (Job.worker_id == worker_id) & (Job.status == RUNNING)
+    )
+    with db.atomic('IMMEDIATE'):
+        return query.execute() > 0
+
+
+def complete_job(job, worker_id):
+    """
+    Mark a job as done, if the worker still holds its lease.
+
+    :return: True if the job was marked as done, False if it was reclaimed by another worker.
+    """
+    query = Job.update(status=DONE, lease_expires_at=None, error=None, updated_at=datetime.now()).where(
+        (Job.id == job.id) & (Job.worker_id == worker_id) & (Job.status == RUNNING)
+    )
+    with db.atomic('IMMEDIATE'):
+        return query.execute() > 0
+
+
+def fail_job(job, worker_id, error, max_attempts=3):
+    """
+    Record a failed attempt of a job, if the worker still holds its lease. The job goes
+    back to pending until it has used up its attempts.
+
+    :return: True if the failure was recorded, False if the job was reclaimed by another worker.
+    """
+    status = FAILED if job.attempts >= max_attempts else PENDING
+    query = Job.update(status=status, lease_expires_at=None, error=str(error)[:255], updated_at=datetime.now()).where(
+        (Job.id == job.id) & (Job.worker_id == worker_id) & (Job.status == RUNNING)
+    )
+    with db.atomic('IMMEDIATE'):
+        return query.execute() > 0
+
+
+def count_jobs():
+    """
+    Count the jobs by kind and status.
+
+    :return: A dictionary mapping (kind, status) to the number of jobs.
+    """
+    query = Job.select(Job.kind, Job.status, fn.COUNT(Job.id).alias('count')).group_by(Job.kind, Job.status)
+    return {(row.kind, row.status): row.count for row in query}
+
+
+def has_unfinished_jobs(kinds=None):
+    """Check whether any job is still pending or running."""
+    query = Job.select().where(Job.status.in_([PENDING, RUNNING]))
+    if kinds:
+        query = query.where(Job.kind.in_(kinds))
+    return query.exists()
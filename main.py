@@ -1,8 +1,9 @@
 import re
 
 from db_manager import connect_db, create_tables, close_db
-from scraper_handler import ScraperHandler
+from scraper_handler import ScraperHandler, IncompleteSeasonError
 from file_downloader import FileDownloader
+from media_processor import MediaProcessor
 
 
 def get_anime_url():
@@ -35,8 +36,8 @@ if __name__ == "__main__":
     # Get the anime URL from the user
     anime_url = get_anime_url()
 
-    # Initialize the scraper
-    scraper = ScraperHandler(anime_url)
+    # Initialize the scraper, detail pages are only fetched for the episodes to download
+    scraper = ScraperHandler(anime_url, listing_mode=True)
 
     # Extract anime name from URL
     try:
@@ -63,7 +64,11 @@ if __name__ == "__main__":
     for season in seasons_to_scrape:
 
         # Fetch episodes for the selected season
-        episodes_in_season = scraper.scrape_episodes_of_season(season_item=season)
+        try:
+            episodes_in_season = scraper.scrape_episodes_of_season(season_item=season)
+        except IncompleteSeasonError as e:
+            print(f"\n{e}\nContinuing with the episodes found on the other pages.")
+            episodes_in_season = e.episodes
         unique_episodes_in_season = list()
 
         # Add unique episodes to the main list
@@ -91,9 +96,14 @@ if __name__ == "__main__":
 
     # Ask the user if they want to start downloading the episodes
     if FileDownloader.get_download_confirmation():
-        downloader = FileDownloader()
-        download_results = downloader.download_episodes(all_episodes)
-        print(f"Download completed for {sum(download_results)} episodes.")
+        # Fetch the download URLs of the episodes found on listing pages
+        all_episodes = scraper.resolve_episodes(all_episodes)
+
+        # Probe the downloaded files (and optionally remux them) while the other downloads run
+        with MediaProcessor(remux=MediaProcessor.get_remux_confirmation()) as media_processor:
+            downloader = FileDownloader(media_processor=media_processor)
+            download_results = downloader.download_episodes(all_episodes)
+            print(f"Download completed for {sum(download_results)} episodes.")
     else:
         print("Download skipped.")
 
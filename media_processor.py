@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from db_manager import update_episode
+
+
+def probe_file(file_path, ffprobe_path="ffprobe"):
+    """
+    Read the real duration, resolution and bitrate of a media file with ffprobe.
+
+    :param file_path: Path of the media file.
+    :param ffprobe_path: Path of the ffprobe executable.
+    :return: A dictionary with the `duration` in seconds, the `resolution` as 'WIDTHxHEIGHT'
+             and the `bitrate` in bits per second. Values ffprobe doesn't report are None.
+    """
+    result = subprocess.run(
+        [ffprobe_path, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", file_path],
+        capture_output=True, text=True, check=True,
+    )
+    return parse_probe_output(result.stdout)
+
+
+def parse_probe_output(output):
+    """
+    Extract the duration, resolution and bitrate from the JSON output of ffprobe.
+
+    :param output: The JSON printed by `ffprobe -print_format json -show_format -show_streams`.
+    :return: A dictionary like the one returned by `probe_file`.
+    """
+    data = json.loads(output)
+    media_format = data.get("format", {})
+    video = next((stream for stream in data.get("streams", []) if stream.get("codec_type") == "video"), {})
+
+    duration = media_format.get("duration") or video.get("duration")
+    bitrate = media_format.get("bit_rate") or video.get("bit_rate")
+    resolution = f"{video['width']}x{video['height']}" if video.get("width") and video.get("height") else None
+
+    return {
+        "duration": float(duration) if duration else None,
+        "resolution": resolution,
+        "bitrate": int(bitrate) if bitrate else None,
+    }
+
+
+def remux_file(file_path, ffmpeg_path="ffmpeg"):
+    """
+    Copy the video and audio streams of a media file into an MP4 container, without
+    re-encoding, and replace the file with the result. Downloaded episodes are always named
+    '.mp4', so this makes the container match the name. Subtitle, data and attachment
+    streams, like the ASS subtitles and fonts of Matroska files, can't be stored in MP4 and
+    are dropped. The index is moved to the front for streaming.
+
+    :param file_path: Path of the media file.
+    :param ffmpeg_path: Path of the ffmpeg executable.
+    """
+    temporary_path = f"{file_path}.remux.mp4"
+    try:
+        subprocess.run(
+            [ffmpeg_path, "-v", "error", "-y", "-i", file_path, "-map", "0:v", "-map", "0:a?", "-c", "copy",
+             "-movflags", "+faststart", "-f", "mp4", temporary_path],
+            capture_output=True, text=True, check=True,
+        )
+        os.replace(temporary_path, file_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def get_error_message(error):
+    """Describe a failed ffmpeg or ffprobe run with what it printed, not just its exit status."""
+    if isinstance(error, subprocess.CalledProcessError) and error.stderr:
+        return error.stderr.strip()
+    return str(error)
+
+
+def process_file(file_path, ffprobe_path, ffmpeg_path=None):
+    """
+    Remux a downloaded file if an ffmpeg path is given, then probe it. The file is
+    probed even if the remux fails, since it's left as it was.
+    Runs in a worker process of the pool.
+
+    :return: The dictionary returned by `probe_file`, with `remuxed` set to whether the file
+             was remuxed and `remux_error` to the error of a failed remux, or None.
+    :raises RuntimeError: If the file can't be probed.
+    """
+    remux_error = None
+    if ffmpeg_path:
+        try:
+            remux_file(file_path, ffmpeg_path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            remux_error = get_error_message(e)
+
+    # CalledProcessError loses its stderr when it's sent back from the worker process
+    try:
+        media_info = probe_file(file_path, ffprobe_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(get_error_message(e)) from None
+
+    media_info["remuxed"] = bool(ffmpeg_path) and remux_error is None
+    media_info["remux_error"] = remux_error
+    return media_info
+
+
+class MediaProcessor:
+    def __init__(self, max_workers=2, remux=False, ffprobe_path=None, ffmpeg_path=None):
+        """
+        Initialize the post-download stage that probes each downloaded file and records
+        its real duration, resolution and bitrate. The files are processed on a bounded
+        process pool, so the work overlaps with the downloads still running. The stage is
+        disabled if ffprobe can't be found, and only probes the files if ffmpeg can't be found.
+
+        :param max_workers: Maximum number of files processed in parallel.
+        :param remux: If True, remux the files to MP4 before probing them.
+        :param ffprobe_path: Path of the ffprobe executable. Defaults to the one on the PATH.
+        :param ffmpeg_path: Path of the ffmpeg executable. Defaults to the one on the PATH.
+        """
+        self.max_workers = max_workers
+        self.ffprobe_path = ffprobe_path or shutil.which("ffprobe")
+        self.ffmpeg_path = (ffmpeg_path or shutil.which("ffmpeg")) if remux else None
+        if remux and not self.ffmpeg_path:
+            print("ffmpeg not found. Downloaded files won't be remuxed.")
+        self.enabled = bool(self.ffprobe_path)
+        if not self.enabled:
+            print("ffprobe not found. Downloaded files won't be probed.")
+
+        self.executor = None
+        self.pending = []  # (episode, file path, future) of the submitted files
+        self.processed = 0  # Number of files processed successfully
+        self.lock = threading.Lock()
+
+    def get_remux_confirmation():
+        """
+        Ask the user whether the downloaded episodes should be remuxed to MP4.
+        Repeats the prompt until the user provides a valid response.
+        """
+        while True:
+            remux_confirm = input("\nDo you want to remux the downloaded episodes to MP4? (yes/no): ").strip().lower() or "no"
+            if remux_confirm in ["yes", "y"]:
+                return True
+            elif remux_confirm in ["no", "n"]:
+                return False
+            else:
+                print("Invalid input. Please enter 'yes' or 'no'.")
+
+    def __enter__(self):
+        if self.enabled:
+            # The pool starts its processes when files are submitted from the download threads,
+            # and forking while those threads hold locks could deadlock the children
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wait()
+
+    def submit(self, episode, file_path):
+        """
+        Queue a downloaded file for processing. Safe to call from the download threads.
+
+        :param episode: Episode object the file belongs to.
+        :param file_path: Path of the downloaded file.
+        """
+        if self.executor is None:
+            return
+        future = self.executor.submit(process_file, file_path, self.ffprobe_path, self.ffmpeg_path)
+        with self.lock:
+            self.pending.append((episode, file_path, future))
+
+    def save_completed(self):
+        """
+        Record the media information of the files processed so far, without waiting for
+        the others. A remuxed file no longer matches the server's size, so it has to be
+        marked as processed soon, or a crash would make the next run resume its download.
+        Call it from the thread that owns the database connection.
+        """
+        completed = []
+        with self.lock:
+            pending, self.pending = self.pending, []
+            for item in pending:
+                (completed if item[2].done() else self.pending).append(item)
+        for episode, file_path, future in completed:
+            self.save_result(episode, file_path, future)
+
+    def wait(self):
+        """
+        Wait for the queued files and record their media information in the database
+        as each of them is processed.
+
+        :return: The number of files processed successfully.
+        """
+        if self.executor is None:
+            return 0
+
+        with self.lock:
+            pending, self.pending = self.pending, []
+        files = {future: (episode, file_path) for episode, file_path, future in pending}
+        for future in as_completed(files):
+            self.save_result(*files[future], future)
+
+        self.executor.shutdown()
+        self.executor = None
+        print(f"Media processing completed for {self.processed} files.")
+        return self.processed
+
+    def save_result(self, episode, file_path, future):
+        """Record the result of a processed file, or report its failure."""
+        try:
+            media_info = future.result()
+        except Exception as e:
+            print(f"Failed to process {file_path}. Error: {e}")
+            return
+
+        if media_info["remux_error"]:
+            print(f"Failed to remux {file_path}, it was only probed. Error: {media_info['remux_error']}")
+        self.save_media_info(episode, media_info)
+        self.processed += 1
+
+    def save_media_info(self, episode, media_info):
+        """Record the probed media information of an episode in the database."""
+        fields = {"is_processed": True}
+        if media_info["duration"] is not None:
+            fields["duration"] = str(timedelta(seconds=round(media_info["duration"])))
+        if media_info["resolution"]:
+            fields["resolution"] = media_info["resolution"]
+        if media_info["bitrate"]:
+            fields["bitrate"] = media_info["bitrate"]
+        if media_info["remuxed"]:
+            fields["file_format"] = "mp4"
+        update_episode(episode, **fields)
@@ -1,4 +1,5 @@
 from peewee import Model, CharField, IntegerField, DateTimeField, BooleanField, ForeignKeyField
+from playhouse.sqlite_ext import FTS5Model, SearchField
 from datetime import datetime
 import peewee
 
@@ -26,6 +27,7 @@ class Season(BaseModel):
     season_number = IntegerField()
     season_url = CharField()
     season_folder_path = CharField()
+    is_fully_scraped = BooleanField(default=False)  # Whether a crawl of all its pages succeeded
 
     class Meta:
         indexes = (
@@ -45,14 +47,54 @@ class Episode(BaseModel):
     duration = CharField(null=True)
     file_format = CharField(null=True)
     resolution = CharField(null=True)
+    bitrate = IntegerField(null=True)  # Bits per second, probed after the download
     episode_url = CharField(null=True)
+    episode_info_url = CharField(null=True)  # Detail page, fetched lazily in listing mode
     episode_folder_path = CharField(null=True)
     retry_count = IntegerField(default=0)  # Tracks failed scraping attempts
+    is_processed = BooleanField(default=False)  # Whether the downloaded file was probed (and remuxed)
 
     class Meta:
         indexes = (
             (('season', 'episode_number'), True),  # Unique per season
+            (('resolution', 'season', 'episode_number'), False),  # Catalog filter by resolution
+            (('file_format', 'season', 'episode_number'), False),  # Catalog filter by format
         )
 
     def __str__(self):
         return f"Episode {self.episode_number}: {self.episode_name} (Season {self.season.season_number}) (Anime {self.season.anime.anime_name})"
+
+
+# Catalog filter for the episodes that don't have a download URL yet
+Episode.add_index(Episode.index(Episode.season, Episode.episode_number, where=Episode.episode_url.is_null(),
+                                name='episode_missing_download'))
+
+
+class EpisodeIndex(FTS5Model):
+    """Full-text index over the episode names and file names, kept in sync with Episode by triggers."""
+    episode_name = SearchField()
+    file_name = SearchField()
+
+    class Meta:
+        database = BaseModel._meta.database
+        table_name = 'episode_index'
+        options = {'content': 'episode', 'content_rowid': 'id'}
+
+
+class Job(BaseModel):
+    kind = CharField()  # 'season', 'episode_details' or 'download'
+    target_id = IntegerField()  # ID of the Season or Episode the job works on
+    status = CharField(default='pending')  # 'pending', 'running', 'done' or 'failed'
+    worker_id = CharField(null=True)  # Worker holding the lease while the job is running
+    lease_expires_at = DateTimeField(null=True)
+    attempts = IntegerField(default=0)
+    error = CharField(null=True)
+
+    class Meta:
+        indexes = (
+            (('kind', 'target_id'), True),  # One job per unit of work
+            (('status', 'lease_expires_at'), False),  # Claiming pending and expired jobs
+        )
+
+    def __str__(self):
+        return f"Job {self.id}: {self.kind} {self.target_id} ({self.status})"
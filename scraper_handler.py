@@ -1,29 +1,61 @@
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import re
+from urllib.parse import urljoin, unquote
 
 from db_manager import (
     add_episode,
     add_season,
     add_anime,
     mark_episode_as_cached,
+    update_episode,
+    update_season,
     get_episode_by_season_and_number,
     get_anime_by_name,
     get_season_by_anime_and_number,
+    get_episodes_by_season,
+    preload_anime,
 )
+from url_classifier import classify_url, EPISODE, EPISODE_LIST, HOME
+
+# Matches the last number in a pagination link, which is the page number
+PAGE_NUMBER_PATTERN = re.compile(r"(\d+)\D*$")
+
+
+class IncompleteSeasonError(Exception):
+    def __init__(self, season_item, episodes, failed_pages):
+        """
+        Raised when some pages of a season couldn't be fetched.
+
+        :param season_item: The Season model instance that was scraped.
+        :param episodes: The Episode model instances scraped from the other pages.
+        :param failed_pages: The URLs of the pages that couldn't be fetched.
+        """
+        super().__init__(
+            f"{len(failed_pages)} page(s) of season {season_item.season_number} couldn't be fetched: "
+            f"{', '.join(failed_pages)}"
+        )
+        self.season_item = season_item
+        self.episodes = episodes
+        self.failed_pages = failed_pages
 
 
 class ScraperHandler:
-    def __init__(self, anime_url):
+    def __init__(self, anime_url, max_workers=4, listing_mode=False):
         """
         Initialize the ScraperHandler with the provided anime URL.
 
         :param anime_url: The URL of the anime to scrape.
+        :param max_workers: Maximum number of season and episode pages fetched in parallel.
+        :param listing_mode: If True, episodes are created from the metadata on listing pages,
+                             and their detail pages are only fetched by `resolve_episodes`.
         """
         self.anime_url = anime_url
+        self.max_workers = max_workers
+        self.listing_mode = listing_mode
 
     def get_anime_model_from_url(self):
         """
@@ -32,11 +64,8 @@ class ScraperHandler:
 
         :return: The Anime model instance for the scraped anime.
         """
-        match = re.search(r"/([^/]+)-Dubbed-Videos", self.anime_url)  # Match the specific pattern before '-Dubbed-Videos'
-        if match:
-            anime_name = match.group(1).replace("-", " ").title()
-
-        else:
+        anime_name = classify_url(self.anime_url).anime  # Name before '-Dubbed-Videos'
+        if not anime_name:
             anime_name = input("please enter anime name: ")
 
         anime = get_anime_by_name(anime_name)
@@ -49,12 +78,17 @@ class ScraperHandler:
     def scrap_seasons(self, anime_item):
         """
         Scrape the seasons for the given anime from the website and save them to the database.
-        If a season already exists, it will not be added again.
+        If a season already exists, it will not be added again. The known seasons and episodes
+        of the anime are preloaded into the identity map of `db_manager` first.
 
         :param anime_item: The Anime model instance for which seasons are being scraped.
         :return: A list of Season model instances for the scraped seasons.
         """
         parent_folder = anime_item.anime_name
+
+        # Load the known seasons and episodes once, instead of querying them one by one
+        preload_anime(anime_item)
+
         response = requests.get(self.anime_url)
 
         # print(response.status_code)
@@ -71,11 +105,10 @@ class ScraperHandler:
                 continue
 
             season_link = "https:" + a_tag.get("href")
-            # Regular expression to find 'season-' followed by a number
-            match = re.search(r"season-(\d+)", season_link, re.IGNORECASE)
+            url_info = classify_url(season_link)
 
-            if match:
-                season_number = int(match.group(1))
+            if url_info.season is not None:
+                season_number = url_info.season
                 # print(season_number)
                 full_path = os.path.join(parent_folder, str(season_number))
 
@@ -137,14 +170,25 @@ class ScraperHandler:
     def scrape_episodes_of_season(self, season_item):
         """
         Scrape all episodes for a given season. If pagination exists on the season page,
-        scrape episodes across all pages. Add episodes to the database or retrieve them
-        if they already exist.
+        infer the full page range and fetch the pages concurrently, in batches of
+        `max_workers`. Paginators that don't link to the last page are read again on the
+        last known page, until the range stops growing. Pages are processed from the newest episodes to the oldest: in
+        page order if the first page lists episodes in descending order, from the last
+        page backwards otherwise. Once a crawl of the season has finished without failed
+        pages, later crawls stop early at the first page whose episodes are all already in
+        the database; the remaining episodes of the season are then taken from the database.
+        A crawl with failed pages makes the next one fetch all the pages again, so the
+        episodes of the failed pages aren't skipped.
 
         :param season_item: The Season model instance for which episodes are being scraped.
         :return: A list of Episode model instances for the scraped episodes.
+        :raises IncompleteSeasonError: If some pages couldn't be fetched. The episodes
+                                       scraped from the other pages are attached to it.
         """
         full_path = season_item.season_folder_path
         episodes = []
+        failed_pages = []
+        is_complete = False
         try:
             # Send a request to the season page
             response = requests.get(season_item.season_url)
@@ -153,46 +197,201 @@ class ScraperHandler:
             # Parse the page content
             soup = BeautifulSoup(response.content, "html.parser")
 
-            # Find the pagination container
-            page_tag = soup.find('ul', attrs={"class": "pagination"})
-
-            if page_tag:
-                pages = page_tag.find_all('li')
+            # Infer the links of all the other pages from the pagination container
+            season_page_links = self.get_season_page_links(soup, season_item.season_url)
+            if not season_page_links:
+                print("No pagination found. Scraping episodes from the first page.")
 
-                for page in pages:
-                    # Find the single <a> tag within the current <div>
-                    a_tag = page.find("a")
-                    # print(a_tag)
-                    if a_tag:  # Ensure <a> tag exists
-                        season_page_link = season_item.season_url + a_tag.get("href")
-                        # print(season_page_link)
+            # Queue the pages from the newest episodes to the oldest, the first one is already fetched
+            episode_numbers = self.get_page_episode_numbers(soup)
+            is_descending = len(episode_numbers) > 1 and episode_numbers[0] > episode_numbers[-1]
+            if is_descending:
+                # The range is extended as the crawl reaches the last known page
+                pages = [(season_item.season_url, soup)] + [(link, None) for link in season_page_links]
+            else:
+                # The crawl starts from the last page, so the full range is needed first
+                last_pages = self.find_last_season_pages(season_page_links, season_item.season_url)
+                pages = [(link, last_pages.get(link)) for link in reversed(season_page_links)]
+                pages.append((season_item.season_url, soup))
+
+            stopped_early = False
+            while pages and not stopped_early:
+                # The first page is already fetched, so it is checked on its own before fetching more
+                batch_size = 1 if pages[0][1] is not None else self.max_workers
+                batch = pages[:batch_size]
+                pages = pages[batch_size:]
+
+                # Fetch the pages of the batch concurrently
+                links_to_fetch = [link for link, page_soup in batch if page_soup is None]
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    fetched = dict(zip(links_to_fetch, executor.map(self.fetch_page, links_to_fetch)))
+
+                for link, page_soup in batch:
+                    page_soup = page_soup or fetched.get(link)
+                    if page_soup is None:
+                        failed_pages.append(link)
+                        continue
+
+                    if is_descending and season_page_links and link == season_page_links[-1]:
+                        new_links = self.get_new_season_page_links(page_soup, season_item.season_url, season_page_links)
+                        season_page_links.extend(new_links)
+                        pages.extend((new_link, None) for new_link in new_links)
+
+                    is_scraped = self.is_page_fully_scraped(page_soup, season_item)
+
+                    # Fetch episodes from this page
+                    episodes_in_page = self.find_season_episodes_from_page(
+                        season_page_link=None,
+                        episode_folder_path=full_path,
+                        season_item=season_item,
+                        soup=page_soup
+                    )
+                    episodes.extend(episodes_in_page)
 
-                        # Fetch episodes from this page
-                        episodes_in_page = self.find_season_episodes_from_page(
-                            season_page_link=season_page_link,
-                            episode_folder_path=full_path,
-                            season_item=season_item,
-                            soup=None
-                        )
-                        episodes.extend(episodes_in_page)
+                    # Older pages may be missing if an earlier crawl didn't finish
+                    if is_scraped and season_item.is_fully_scraped:
+                        stopped_early = True
+                        break
 
-            else:
-                # If pagination is not found, scrape the first season page directly
-                print("No pagination found. Scraping episodes from the first page.")
-                episodes = self.find_season_episodes_from_page(
-                    season_page_link=season_item.season_url,
-                    episode_folder_path=full_path,
-                    season_item=season_item,
-                    soup=soup
-                )
+            if stopped_early:
+                print(f"Season {season_item.season_number} is up to date. Loading the remaining episodes from the database.")
+                for episode in get_episodes_by_season(season_item):
+                    if episode not in episodes:
+                        episodes.append(episode)
+            is_complete = True
 
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while requesting the page: {e}")
+            failed_pages.append(season_item.season_url)
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
 
+        if is_complete and not failed_pages and not season_item.is_fully_scraped:
+            update_season(season_item, is_fully_scraped=True)
+        elif failed_pages and season_item.is_fully_scraped:
+            update_season(season_item, is_fully_scraped=False)
+
+        if failed_pages:
+            raise IncompleteSeasonError(season_item, episodes, failed_pages)
+
         return episodes
 
+    def get_season_page_links(self, soup, season_url):
+        """
+        Infer the links of all the pages of a season, except the first one, from the
+        pagination container. Windowed paginators only show a few pages around the current
+        one, so the full range is built from the highest page number found.
+
+        :param soup: BeautifulSoup object of the first season page.
+        :param season_url: The URL of the season.
+        :return: A list of page URLs, ordered by page number.
+        """
+        page_tag = soup.find('ul', attrs={"class": "pagination"})
+        if not page_tag:
+            return []
+
+        page_hrefs = {}
+        for a_tag in page_tag.find_all("a"):
+            href = a_tag.get("href")
+            match = PAGE_NUMBER_PATTERN.search(href) if href else None
+            if match:
+                page_hrefs[int(match.group(1))] = href
+
+        if not page_hrefs:
+            return []
+
+        # Use the link of the last page as a template for the pages that aren't shown
+        last_page = max(page_hrefs)
+        template = page_hrefs[last_page]
+        match = PAGE_NUMBER_PATTERN.search(template)
+
+        season_page_links = []
+        for page_number in range(2, last_page + 1):
+            href = page_hrefs.get(page_number, template[:match.start(1)] + str(page_number) + template[match.end(1):])
+            season_page_links.append(season_url + href)
+
+        return season_page_links
+
+    def get_new_season_page_links(self, soup, season_url, season_page_links):
+        """
+        Get the links of the pages shown by the paginator of a season page that are
+        beyond the known ones.
+
+        :param soup: BeautifulSoup object of a season page.
+        :param season_url: The URL of the season.
+        :param season_page_links: The known page URLs, ordered by page number.
+        :return: A list of the new page URLs, ordered by page number.
+        """
+        known_links = set(season_page_links)
+        return [link for link in self.get_season_page_links(soup, season_url) if link not in known_links]
+
+    def find_last_season_pages(self, season_page_links, season_url):
+        """
+        Fetch the last known page of a season until its paginator shows no further pages,
+        extending `season_page_links` in place.
+
+        :param season_page_links: The known page URLs, ordered by page number.
+        :param season_url: The URL of the season.
+        :return: A dictionary mapping the URLs of the fetched pages to their BeautifulSoup object.
+        """
+        last_pages = {}
+        while season_page_links:
+            last_link = season_page_links[-1]
+            page_soup = self.fetch_page(last_link)
+            if page_soup is None:
+                break  # The crawl fetches it again and reports it if it still fails
+            last_pages[last_link] = page_soup
+
+            new_links = self.get_new_season_page_links(page_soup, season_url, season_page_links)
+            if not new_links:
+                break
+            season_page_links.extend(new_links)
+        return last_pages
+
+    def fetch_page(self, page_link):
+        """
+        Fetch and parse a single page.
+
+        :param page_link: The URL of the page.
+        :return: BeautifulSoup object of the page or None if the request fails.
+        """
+        try:
+            response = requests.get(page_link)
+            response.raise_for_status()
+            return BeautifulSoup(response.text, 'html.parser')
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred while requesting the page {page_link}: {e}")
+            return None
+
+    def get_page_episode_numbers(self, soup):
+        """
+        Get the numbers of the episodes linked from a season page, in page order.
+
+        :param soup: BeautifulSoup object of the season page.
+        :return: A list of episode numbers.
+        """
+        episode_numbers = []
+        for episode in soup.find_all('div', attrs={"class": 'Singamdasam'}):
+            a_tag = episode.find("a")
+            if a_tag and a_tag.get("href"):
+                url_info = classify_url("https:" + a_tag.get("href"))
+                if url_info.kind in (EPISODE, EPISODE_LIST):
+                    episode_numbers.append(url_info.episode)
+        return episode_numbers
+
+    def is_page_fully_scraped(self, soup, season_item):
+        """
+        Check whether all the episodes linked from a season page are already in the database.
+
+        :param soup: BeautifulSoup object of the season page.
+        :param season_item: The Season model instance to which the episodes belong.
+        :return: True if the page links to episodes and all of them exist, False otherwise.
+        """
+        episode_numbers = self.get_page_episode_numbers(soup)
+        if not episode_numbers:
+            return False
+        return all(get_episode_by_season_and_number(season_item, number) for number in episode_numbers)
+
     def find_season_episodes_from_page(self, season_page_link, episode_folder_path, season_item, soup):
         """
         Scrape episodes from a single page of a season.
@@ -219,27 +418,37 @@ class ScraperHandler:
             if a_tag:  # Ensure <a> tag exists
                 episode_link = "https:" + a_tag.get("href")
 
-                # Extract episode number and decide function
-                episode_number, function_identifier = self.extract_episode_number(episode_link)
-                if not episode_number and episode_link != "https://eng.cartoonsarea.cc/":
-                    print(f"couldn't find episode number from {episode_link}")
+                # Classify the link to get the episode number and decide function
+                url_info = classify_url(episode_link)
+                episode_number = url_info.episode
+                if url_info.kind not in (EPISODE, EPISODE_LIST):
+                    if url_info.kind != HOME:
+                        print(f"couldn't find episode number from {episode_link}")
                     continue  # Skip if no valid episode number is found
 
                 # Check if the episode already exists in the database
                 episode_item = get_episode_by_season_and_number(season_item, episode_number)
                 if not episode_item:
                     # Use the appropriate function based on the identifier
-                    if function_identifier == 1:
+                    if url_info.kind == EPISODE and self.listing_mode:
+                        episode_item = self.get_listed_episode_item(
+                            episode_info_link=episode_link,
+                            episode_folder_path=episode_folder_path,
+                            season_item=season_item,
+                            link_text=a_tag.text.strip()
+                        )
+                    elif url_info.kind == EPISODE:
                         episode_item = self.get_episode_item(
                             episode_info_link=episode_link,
                             episode_folder_path=episode_folder_path,
                             season_item=season_item
                         )
-                    elif function_identifier == 2:
+                    elif url_info.kind == EPISODE_LIST:
                         episode_items = self.get_episodes_info_url(
                             episode_link=episode_link,
                             episode_folder_path=episode_folder_path,
-                            season_item=season_item
+                            season_item=season_item,
+                            episode_number=episode_number
                         )
                         for episode_item in episode_items:
                             # Add the episode to the list if it's valid and unique
@@ -253,36 +462,17 @@ class ScraperHandler:
 
         return episodes
 
-    def extract_episode_number(self, url):
-        """
-        Extract the episode number from the given URL and indicate which function to use.
-        :param url: The URL containing the episode information.
-        :return: A tuple (episode_number, identifier) where identifier is 1 or 2.
-        """
-        # First pattern: Match '/123' where the number is clung to the word
-        match_file_number = re.search(r"/(\d+)(?=[A-Za-z!]|\s)", url)  # Matches numbers before letters or special characters
-        if match_file_number:
-            return int(match_file_number.group(1)), 1
-
-        # Second pattern: Match 'Episode-123' or 'Season-123'
-        match_episode_season = re.findall(r"(?:Episode-|Season-)(\d+)", url, re.IGNORECASE)
-        if match_episode_season and len(match_episode_season) > 1:  # Ensure there are enough matches
-            return int(match_episode_season[1]), 2
-
-        # If no matches are found
-        if url != "https://eng.cartoonsarea.cc/":
-            print(f"Unable to extract episode number from URL: {url}")
-        return None, None
-
-    def get_episodes_info_url(self, episode_link, episode_folder_path, season_item):
+    def get_episodes_info_url(self, episode_link, episode_folder_path, season_item, episode_number=None):
         """
         Scrape detailed episode information from a given episode link. Extract
         metadata such as episode name, size, format, resolution, and download URL.
-        Save the episode to the database.
+        Save the episode to the database. In listing mode, only the name and size shown
+        on the listing page are saved.
 
         :param episode_link: The URL of the episode page to scrape.
         :param episode_folder_path: The folder path where the episode will be saved.
         :param season_item: The Season model instance to which the episode belongs.
+        :param episode_number: (Optional) Episode number to use when a file link doesn't contain one.
         :return: A list of Episode model instances with detailed metadata.
         """
         response = requests.get(episode_link)
@@ -310,12 +500,24 @@ class ScraperHandler:
                     # Remove "MB" and convert size to float for comparison
                     size_value = float(size_text.replace('MB', '').strip())
                     if size_value > 0:  # Only add links with size > 0 MB
-                        links.append("https:" + a_tag['href'])
+                        links.append(("https:" + a_tag['href'], a_tag.text.strip(), size_text.strip()))
 
         episode_items = list()
         # Print the extracted links
-        for link in links:
+        for link, link_text, size_text in links:
             # print(f"Link: {link}")
+            if self.listing_mode:
+                episode_item = self.get_listed_episode_item(
+                    episode_info_link=link,
+                    episode_folder_path=episode_folder_path,
+                    season_item=season_item,
+                    link_text=link_text,
+                    episode_size=size_text,
+                    episode_number=episode_number
+                )
+                episode_items.append(episode_item)
+                continue
+
             episode_item = self.get_episode_item(
                 episode_info_link=link,
                 episode_folder_path=episode_folder_path,
@@ -355,11 +557,83 @@ class ScraperHandler:
             file_format=details["file_format"],
             resolution=details["resolution"],
             episode_url=details["episode_url"],
+            episode_info_url=episode_info_link,
             episode_folder_path=episode_folder_path,
         )
         mark_episode_as_cached(episode)
         return episode
 
+    def get_listed_episode_item(self, episode_info_link, episode_folder_path, season_item, link_text=None,
+                                episode_size=None, episode_number=None):
+        """
+        Create an episode from the metadata shown on a listing page, without visiting
+        its detail page. The episode isn't marked as cached until its download URL and
+        remaining details are fetched by `resolve_episodes`.
+
+        :param episode_info_link: The URL of the episode's detail page.
+        :param episode_folder_path: The folder path where the episode will be saved.
+        :param season_item: The Season model instance to which the episode belongs.
+        :param link_text: (Optional) Text of the link, used as the file name.
+        :param episode_size: (Optional) Size shown next to the link.
+        :param episode_number: (Optional) Episode number to use when the link doesn't contain one.
+        :return: An Episode model instance with listing metadata or None if it has no episode number.
+        """
+        url_info = classify_url(episode_info_link)
+        if url_info.episode is not None:
+            episode_number = url_info.episode
+        if episode_number is None:
+            print(f"couldn't find episode number from {episode_info_link}")
+            return None
+
+        # Several files can be listed for the same episode, keep the first one
+        episode = get_episode_by_season_and_number(season_item, episode_number)
+        if episode:
+            return episode
+
+        file_name = link_text or unquote(episode_info_link.rstrip("/").rsplit("/", 1)[-1])
+        return add_episode(
+            season=season_item,
+            episode_number=episode_number,
+            episode_name=self.get_episode_name(file_name),
+            file_name=file_name,
+            episode_size=episode_size,
+            episode_info_url=episode_info_link,
+            episode_folder_path=episode_folder_path,
+        )
+
+    def resolve_episodes(self, episodes):
+        """
+        Fetch the detail pages of the episodes created in listing mode, in parallel, and
+        save their download URL and remaining details. Episodes that are already cached are
+        returned as they are.
+
+        :param episodes: A list of Episode model instances.
+        :return: A list of Episode model instances that have a download URL.
+        """
+        unresolved = [episode for episode in episodes if not episode.is_cached or not episode.episode_url]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            soups = list(executor.map(self.fetch_page, [episode.episode_info_url for episode in unresolved]))
+
+        for episode, soup in zip(unresolved, soups):
+            details = self.extract_episode_details(soup) if soup else None
+            if not details or not details.get("episode_url"):
+                print(f"Failed to scrape details for episode at {episode.episode_info_url}. Skipping.")
+                continue
+
+            update_episode(
+                episode,
+                episode_name=details["episode_name"],
+                file_name=details["file_name"],
+                episode_size=details["episode_size"],
+                duration=details["duration"],
+                file_format=details["file_format"],
+                resolution=details["resolution"],
+                episode_url=details["episode_url"],
+            )
+            mark_episode_as_cached(episode)
+
+        return [episode for episode in episodes if episode.is_cached and episode.episode_url]
+
     def extract_episode_details(self, soup):
         """
         Extract detailed metadata for an episode from a BeautifulSoup object.
@@ -401,8 +675,16 @@ class ScraperHandler:
         details["resolution"] = details.get("Resolution:", "Unknown")
 
         # Extract episode number and name
-        details["episode_number"], function_identifier = self.extract_episode_number(details['episode_url'])
-
+        details["episode_number"] = classify_url(details['episode_url']).episode
 
-        details["episode_name"] = file_name.split(maxsplit=1)[-1].rsplit('.', 1)[0] if " " in file_name else "Unknown"
+        details["episode_name"] = self.get_episode_name(file_name)
         return details
+
+    def get_episode_name(self, file_name):
+        """
+        Infer the episode name from a file name such as '12 Episode Name.mp4'.
+
+        :param file_name: The file name of the episode.
+        :return: The episode name or "Unknown" if the file name has no name part.
+        """
+        return file_name.split(maxsplit=1)[-1].rsplit('.', 1)[0] if " " in file_name else "Unknown"
@@ -0,0 +1,91 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Modules imported by the entry points
+ENTRY_MODULES = ["main", "catalog", "worker"]
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_import_times(code):
+    """
+    Run code in a fresh interpreter with `-X importtime`.
+
+    :return: A dictionary mapping module names to their cumulative import time in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imports[name.strip()] = int(cumulative) / 1000
+    return imports
+
+
+def measure_import(module, runs=5):
+    """
+    Import a module in fresh interpreters with `-X importtime`.
+
+    :param module: Name of the module to import.
+    :param runs: Number of interpreters to start.
+    :return: A tuple (median, slowest) of the median cumulative import time of the module in
+             milliseconds and a list of (milliseconds, name) of its 5 slowest dependencies.
+    """
+    # Modules imported by the interpreter itself aren't the entry point's fault
+    startup_modules = set(read_import_times("pass"))
+
+    totals = []
+    for _ in range(runs):
+        imports = read_import_times(f"import {module}")
+        totals.append(imports[module])
+
+    slowest = sorted(
+        ((ms, name) for name, ms in imports.items() if name != module and name not in startup_modules),
+        reverse=True,
+    )[:5]
+    return statistics.median(totals), slowest
+
+
+def measure_schema_check(runs=5):
+    """
+    Run `create_tables` twice on a new database in fresh interpreters, to compare
+    creating the schema with the version check on an up-to-date database.
+
+    :return: A tuple (create, check) of median times in milliseconds.
+    """
+    code = (
+        "import time\n"
+        "from db_manager import create_tables\n"
+        "start = time.perf_counter(); create_tables(); create = time.perf_counter() - start\n"
+        "start = time.perf_counter(); create_tables(); check = time.perf_counter() - start\n"
+        "print(create * 1000, check * 1000)\n"
+    )
+    creates, checks = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [sys.executable, "-c", code], cwd=directory, capture_output=True, text=True, check=True,
+                env={**os.environ, "PYTHONPATH": PROJECT_DIR},
+            )
+        create, check = result.stdout.split()[-2:]
+        creates.append(float(create))
+        checks.append(float(check))
+    return statistics.median(creates), statistics.median(checks)
+
+
+if __name__ == "__main__":
+    for module in ENTRY_MODULES:
+        median, slowest = measure_import(module)
+        print(f"\nimport {module}: {median:.1f} ms")
+        for ms, name in slowest:
+            print(f"  {name}: {ms:.1f} ms")
+
+    create, check = measure_schema_check()
+    print(f"\ncreate_tables: {create:.1f} ms on a new database, {check:.2f} ms when up to date")
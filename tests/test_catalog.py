@@ -0,0 +1,69 @@
+import pytest
+
+from catalog import list_episodes, search_episodes, get_arguments
+from db_manager import add_anime, add_season, add_episode, update_episode
+
+
+@pytest.fixture
+def catalog(database):
+    anime = add_anime("One Piece", "https://eng.cartoonsarea.cc/One-Piece-Dubbed-Videos/")
+    season = add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", "One Piece/1")
+    add_episode(season, 1, "Romance: Dawn (Uncut)", "1 Romance: Dawn (Uncut).mp4", resolution="1280x720")
+    add_episode(season, 2, "The Man in the Straw Hat", "2 The Man in the Straw Hat.mp4", resolution="640x360")
+    add_episode(season, 3, 'Say "AND" Or "OR"', '3 Say "AND" Or "OR".mp4', resolution="1280x720")
+    return season
+
+
+def episode_numbers(result):
+    episodes, total = result
+    assert total == len(episodes)
+    return [episode.episode_number for episode in episodes]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("romance: dawn", [1]),
+    ("episode 1 (uncut)", []),
+    ("(uncut)", [1]),
+    ("AND", [3]),
+    ("straw hat", [2]),
+    ('"', []),
+    ('say "and', [3]),
+    ("NOT -dawn*", []),
+])
+def test_search_treats_punctuation_and_keywords_as_text(catalog, text, expected):
+    assert episode_numbers(search_episodes(text)) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   "])
+def test_search_without_terms_has_no_results(catalog, text):
+    assert search_episodes(text) == ([], 0)
+
+
+def test_search_follows_renamed_episodes(catalog):
+    episode = list_episodes(season_number=1)[0][1]
+    update_episode(episode, episode_name="Straw Hat Returns", file_name="2 Straw Hat Returns.mp4")
+
+    assert episode_numbers(search_episodes("man")) == []
+    assert episode_numbers(search_episodes("returns")) == [2]
+
+
+def test_list_episodes_filters_and_paginates(catalog):
+    assert episode_numbers(list_episodes(resolution="1280x720")) == [1, 3]
+    episodes, total = list_episodes(page=2, per_page=2)
+    assert [episode.episode_number for episode in episodes] == [3]
+    assert total == 3
+
+
+@pytest.mark.parametrize("args", [
+    ["anime", "--per-page", "0"],
+    ["episodes", "--page", "0"],
+    ["search", "dawn", "--page", "-1"],
+    ["search", "dawn", "--per-page", "many"],
+])
+def test_page_arguments_must_be_positive(args):
+    with pytest.raises(SystemExit):
+        get_arguments(args)
+
+
+def test_page_arguments():
+    assert vars(get_arguments(["search", "dawn", "--page", "2", "--per-page", "10"]))["per_page"] == 10
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from db_manager import (
+    SCHEMA_VERSION,
+    db,
+    create_tables,
+    add_anime,
+    add_season,
+    add_episode,
+    update_episode,
+    preload_anime,
+    clear_cache,
+    get_season_by_anime_and_number,
+    get_episode_by_season_and_number,
+    get_episodes_by_season,
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_processes_starting_together_upgrade_the_schema_once(tmp_path):
+    code = "from db_manager import create_tables; create_tables()"
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", code], cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, env={**os.environ, "PYTHONPATH": PROJECT_DIR},
+        )
+        for _ in range(4)
+    ]
+    for process in processes:
+        _, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+
+    db.init(str(tmp_path / "anime_database.db"))
+    assert db.pragma('user_version') == SCHEMA_VERSION
+    db.close()
+
+
+def test_newer_schema_is_not_downgraded(database):
+    database.pragma('user_version', SCHEMA_VERSION + 1)
+    create_tables()
+    assert database.pragma('user_version') == SCHEMA_VERSION + 1
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Record the SQL queries run on the database."""
+    executed = []
+    execute_sql = db.execute_sql
+
+    def record(sql, *args, **kwargs):
+        executed.append(sql)
+        return execute_sql(sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute_sql", record)
+    return executed
+
+
+@pytest.fixture
+def anime(database):
+    anime = add_anime("One Piece", "https://eng.cartoonsarea.cc/One-Piece-Dubbed-Videos/")
+    for season_number in (1, 2):
+        season = add_season(anime, season_number, f"https://eng.cartoonsarea.cc/One-Piece-Season-{season_number}/",
+                            f"One Piece/{season_number}")
+        for episode_number in (1, 2, 3):
+            add_episode(season, episode_number, f"Episode {episode_number}")
+    clear_cache()
+    return anime
+
+
+def test_preloaded_lookups_run_no_queries(anime, queries):
+    preload_anime(anime)
+    assert len(queries) == 2
+    queries.clear()
+
+    season = get_season_by_anime_and_number(anime, 2)
+    episode = get_episode_by_season_and_number(season, 3)
+    assert (season.season_number, episode.episode_number) == (2, 3)
+    assert episode.season is season
+    assert get_season_by_anime_and_number(anime, 3) is None
+    assert get_episode_by_season_and_number(season, 4) is None
+    assert [episode.episode_number for episode in get_episodes_by_season(season)] == [1, 2, 3]
+    assert queries == []
+
+
+def test_identity_map_follows_added_and_updated_rows(anime, queries):
+    preload_anime(anime)
+    season = get_season_by_anime_and_number(anime, 1)
+    episode = get_episode_by_season_and_number(season, 1)
+
+    # Existing rows come back as the instances in the map
+    assert add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", "One Piece/1") is season
+    assert add_episode(season, 1, "Episode 1") is episode
+
+    update_episode(episode, episode_name="Romance Dawn")
+    new_season = add_season(anime, 3, "https://eng.cartoonsarea.cc/One-Piece-Season-3/", "One Piece/3")
+    new_episode = add_episode(new_season, 1, "Episode 1")
+    queries.clear()
+
+    assert get_episode_by_season_and_number(season, 1).episode_name == "Romance Dawn"
+    assert get_season_by_anime_and_number(anime, 3) is new_season
+    assert get_episode_by_season_and_number(new_season, 1) is new_episode
+    assert new_episode.season is new_season
+    assert queries == []
+
+
+def test_existing_rows_are_returned_without_preloading(anime):
+    season = add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", "One Piece/1")
+    assert get_season_by_anime_and_number(anime, 1) is season
+    episode = add_episode(season, 2, "Another name")
+    assert episode.episode_name == "Episode 2"
+    assert get_episode_by_season_and_number(season, 2) is episode
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+import time
+
+from db_manager import db
+from job_store import (
+    DOWNLOAD_JOB,
+    DONE,
+    FAILED,
+    RUNNING,
+    enqueue_job,
+    claim_job,
+    complete_job,
+    fail_job,
+    count_jobs,
+)
+from models import Job
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Claims jobs until there are none left and prints their IDs
+DRAIN_CODE = """
+import sys
+from db_manager import db
+from job_store import claim_job, complete_job
+db.init(sys.argv[1])
+while (job := claim_job(sys.argv[2], lease_seconds=30)) is not None:
+    assert complete_job(job, sys.argv[2])
+    print(job.id)
+"""
+
+# Claims a single job, prints its ID and hangs
+CLAIM_AND_HANG_CODE = """
+import sys, time
+from db_manager import db
+from job_store import claim_job
+db.init(sys.argv[1])
+print(claim_job(sys.argv[2], lease_seconds=1).id, flush=True)
+time.sleep(60)
+"""
+
+
+def start_worker(code, database, worker_id):
+    db.close()  # The child processes open their own connections
+    return subprocess.Popen(
+        [sys.executable, "-c", code, database.database, worker_id],
+        stdout=subprocess.PIPE, text=True, env={**os.environ, "PYTHONPATH": PROJECT_DIR},
+    )
+
+
+def test_workers_drain_jobs_without_double_claims(database):
+    for target_id in range(200):
+        enqueue_job(DOWNLOAD_JOB, target_id)
+
+    workers = [start_worker(DRAIN_CODE, database, f"worker-{i}") for i in range(4)]
+    claimed = []
+    for process in workers:
+        stdout, _ = process.communicate(timeout=60)
+        assert process.returncode == 0
+        claimed += [int(job_id) for job_id in stdout.split()]
+
+    assert sorted(claimed) == [job.id for job in Job.select().order_by(Job.id)]
+    assert count_jobs() == {(DOWNLOAD_JOB, DONE): 200}
+    assert not Job.select().where(Job.attempts != 1).exists()
+
+
+def test_killed_workers_job_is_reclaimed_after_its_lease_expires(database):
+    enqueue_job(DOWNLOAD_JOB, 1)
+
+    process = start_worker(CLAIM_AND_HANG_CODE, database, "worker-1")
+    job_id = int(process.stdout.readline())
+    process.kill()
+    process.wait()
+
+    assert claim_job("worker-2") is None
+    time.sleep(1.1)
+    job = claim_job("worker-2")
+    assert job.id == job_id
+    assert (job.status, job.worker_id, job.attempts) == (RUNNING, "worker-2", 2)
+    assert complete_job(job, "worker-2")
+
+
+def test_job_fails_after_max_attempts(database):
+    enqueue_job(DOWNLOAD_JOB, 1)
+    enqueue_job(DOWNLOAD_JOB, 2)
+
+    # Job 1 fails every attempt
+    for _ in range(2):
+        job = claim_job("worker-1", max_attempts=2)
+        assert job.target_id == 1
+        assert fail_job(job, "worker-1", "Download failed.", max_attempts=2)
+
+    # Job 2's leases keep expiring
+    for _ in range(2):
+        assert claim_job("worker-1", lease_seconds=0, max_attempts=2).target_id == 2
+
+    assert claim_job("worker-1", lease_seconds=0, max_attempts=2) is None
+    failed = {job.target_id: job.error for job in Job.select().where(Job.status == FAILED)}
+    assert failed == {1: "Download failed.", 2: "Lease expired too many times."}
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from db_manager import add_anime, add_season, add_episode
+from media_processor import MediaProcessor, parse_probe_output, process_file
+from models import Episode
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def find_ffmpeg():
+    """Find ffmpeg on the PATH or in the imageio-ffmpeg package, if it's installed."""
+    if shutil.which("ffmpeg"):
+        return shutil.which("ffmpeg")
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        return None
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def test_parse_probe_output():
+    # Captured with `ffprobe -v error -print_format json -show_format -show_streams clip.mkv`
+    # for a 2 second 320x240 H.264 and AAC clip
+    with open(os.path.join(FIXTURES_DIR, "ffprobe_output.json")) as file:
+        media_info = parse_probe_output(file.read())
+
+    assert media_info == {"duration": 2.023, "resolution": "320x240", "bitrate": 117567}
+
+
+def test_parse_probe_output_without_video():
+    assert parse_probe_output('{"streams": [{"codec_type": "audio"}], "format": {}}') == {
+        "duration": None, "resolution": None, "bitrate": None,
+    }
+
+
+def write_tool(path, script):
+    """Write an executable shell script standing in for ffmpeg or ffprobe."""
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def fake_tools(tmp_path):
+    """A fake ffprobe printing the captured output and an ffmpeg failing like on a file with ASS subtitles."""
+    ffprobe_path = write_tool(tmp_path / "ffprobe", f"cat '{os.path.join(FIXTURES_DIR, 'ffprobe_output.json')}'\n")
+    ffmpeg_path = write_tool(
+        tmp_path / "ffmpeg",
+        "echo 'Could not find tag for codec ass in stream #2, codec not currently supported in container' >&2\n"
+        "exit 1\n",
+    )
+    return ffprobe_path, ffmpeg_path
+
+
+def test_file_is_probed_when_the_remux_fails(fake_tools, tmp_path):
+    ffprobe_path, ffmpeg_path = fake_tools
+    file_path = tmp_path / "1_Romance_Dawn.mp4"
+    file_path.write_bytes(b"video")
+
+    media_info = process_file(str(file_path), ffprobe_path, ffmpeg_path)
+
+    assert media_info["duration"] == 2.023
+    assert not media_info["remuxed"]
+    assert "Could not find tag for codec ass" in media_info["remux_error"]
+    assert file_path.read_bytes() == b"video"
+
+
+def test_failed_remux_is_recorded_as_probed(database, fake_tools, tmp_path, capsys):
+    ffprobe_path, ffmpeg_path = fake_tools
+    anime = add_anime("One Piece", "https://eng.cartoonsarea.cc/One-Piece-Dubbed-Videos/")
+    season = add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", str(tmp_path))
+    episode = add_episode(season, 1, "Romance Dawn", "1 Romance Dawn.mp4", file_format="mkv")
+    file_path = tmp_path / "1_Romance_Dawn.mp4"
+    file_path.write_bytes(b"video")
+
+    with MediaProcessor(remux=True, ffprobe_path=ffprobe_path, ffmpeg_path=ffmpeg_path) as media_processor:
+        media_processor.submit(episode, str(file_path))
+
+    episode = Episode.get_by_id(episode.id)
+    assert episode.is_processed
+    assert (episode.duration, episode.resolution, episode.bitrate, episode.file_format) == ("0:00:02", "320x240", 117567, "mkv")
+    assert "Could not find tag for codec ass" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(not find_ffmpeg() or not shutil.which("ffprobe"), reason="ffmpeg and ffprobe are needed")
+def test_downloaded_file_is_remuxed_and_probed(database, tmp_path):
+    anime = add_anime("One Piece", "https://eng.cartoonsarea.cc/One-Piece-Dubbed-Videos/")
+    season = add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", str(tmp_path))
+    episode = add_episode(season, 1, "Romance Dawn", "1 Romance Dawn.mp4", file_format="mkv")
+
+    # A tiny Matroska clip with ASS subtitles, which MP4 can't store, saved under an '.mp4'
+    # name like the downloads
+    subtitles_path = tmp_path / "subtitles.srt"
+    subtitles_path.write_text("1\n00:00:00,000 --> 00:00:01,000\nI'm going to be King of the Pirates!\n")
+    file_path = str(tmp_path / "1_Romance_Dawn.mp4")
+    subprocess.run(
+        [find_ffmpeg(), "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=2:size=320x240:rate=10",
+         "-f", "lavfi", "-i", "sine=duration=2", "-i", str(subtitles_path),
+         "-map", "0", "-map", "1", "-map", "2", "-c:v", "mpeg4", "-c:a", "mp2", "-c:s", "ass",
+         "-f", "matroska", file_path],
+        check=True,
+    )
+    os.remove(subtitles_path)
+
+    with MediaProcessor(remux=True, ffmpeg_path=find_ffmpeg()) as media_processor:
+        media_processor.submit(episode, file_path)
+        media_processor.pending[0][2].result()
+
+        # Recorded as soon as it's processed, before the other files are waited for
+        media_processor.save_completed()
+        assert media_processor.processed == 1
+        assert Episode.get_by_id(episode.id).is_processed
+
+    episode = Episode.get_by_id(episode.id)
+    assert (episode.duration, episode.resolution, episode.file_format) == ("0:00:02", "320x240", "mp4")
+
+    output = subprocess.run(
+        [shutil.which("ffprobe"), "-v", "error", "-print_format", "json", "-show_format", file_path],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    assert "mp4" in json.loads(output)["format"]["format_name"]
+    assert sorted(os.listdir(tmp_path)) == ["1_Romance_Dawn.mp4", "anime_database.db"]
@@ -0,0 +1,231 @@
+import types
+
+import pytest
+import requests
+
+import scraper_handler
+from db_manager import add_anime, add_season, add_episode, update_season
+from scraper_handler import ScraperHandler, IncompleteSeasonError
+
+ANIME_URL = "https://eng.cartoonsarea.cc/English-Dubbed-Series/O-Dubbed-Series/One-Piece-Dubbed-Videos/"
+SEASON_URL = ANIME_URL + "One-Piece-Season-1-Dubbed-Videos/"
+
+
+def episode_link(number):
+    return f"{ANIME_URL}Season-1/{number} Episode {number}.html"
+
+
+def season_site(page_count, per_page=3, descending=False, extra_episodes=0, window=None):
+    """
+    Build the pages of a season, with a windowed paginator showing pages 1, 2 and the last one,
+    or, if `window` is set, only the pages up to `window` pages after the current one.
+    """
+    total = page_count * per_page + extra_episodes
+    numbers = list(range(1, total + 1))
+    if descending:
+        numbers.reverse()
+
+    pages = {}
+    for page in range(1, page_count + 1):
+        shown = range(1, min(page + window, page_count) + 1) if window else (1, 2, page_count)
+        paginator = '<ul class="pagination">' + "".join(
+            f'<li><a href="?page={shown_page}">{shown_page}</a></li>' for shown_page in shown
+        ) + "</ul>"
+        page_numbers = numbers[(page - 1) * per_page:] if page == page_count else numbers[(page - 1) * per_page:page * per_page]
+        body = "".join(
+            f'<div class="Singamdasam"><a href="{episode_link(number)[6:]}">{number} Episode {number}.mp4</a></div>'
+            for number in page_numbers
+        )
+        pages[SEASON_URL + ("" if page == 1 else f"?page={page}")] = body + paginator
+    return pages
+
+
+@pytest.fixture
+def site(monkeypatch):
+    """Serve fake pages instead of the website and record the requested URLs."""
+    fake = types.SimpleNamespace(pages={}, failing=set(), requested=[])
+
+    def get(url, **kwargs):
+        fake.requested.append(url)
+        if url in fake.failing:
+            raise requests.exceptions.ConnectionError(f"Failed to fetch {url}")
+        text = fake.pages[url]
+        return types.SimpleNamespace(text=text, content=text.encode(), raise_for_status=lambda: None)
+
+    monkeypatch.setattr(scraper_handler.requests, "get", get)
+    return fake
+
+
+@pytest.fixture
+def season(database):
+    anime = add_anime("One Piece", ANIME_URL)
+    return add_season(anime, 1, SEASON_URL, "One Piece/1")
+
+
+def page_url(page):
+    return SEASON_URL + f"?page={page}"
+
+
+def test_failed_batch_does_not_stop_the_crawl(site, season):
+    site.pages = season_site(6)
+    site.failing = {page_url(5), page_url(6)}  # The first batch walked from the last page
+    scraper = ScraperHandler(ANIME_URL, max_workers=2, listing_mode=True)
+
+    with pytest.raises(IncompleteSeasonError) as error:
+        scraper.scrape_episodes_of_season(season)
+
+    assert all(page_url(page) in site.requested for page in range(2, 7))
+    assert error.value.failed_pages == [page_url(6), page_url(5)]
+    assert sorted(episode.episode_number for episode in error.value.episodes) == list(range(1, 13))
+
+
+def test_ascending_season_refresh_finds_new_episodes_on_the_last_page(site, season):
+    site.pages = season_site(4)
+    scraper = ScraperHandler(ANIME_URL, max_workers=2, listing_mode=True)
+    assert len(scraper.scrape_episodes_of_season(season)) == 12
+
+    # Two new episodes are added to the last page
+    site.pages = season_site(4, extra_episodes=2)
+    site.requested.clear()
+    episodes = scraper.scrape_episodes_of_season(season)
+
+    assert sorted(episode.episode_number for episode in episodes) == list(range(1, 15))
+    # Walking back from the last page stops at the batch with the first page that is already scraped
+    assert site.requested == [SEASON_URL, page_url(4), page_url(3), page_url(2)]
+
+
+def test_descending_season_refresh_stops_on_the_first_page(site, season):
+    for number in range(1, 13):
+        add_episode(season, number, f"Episode {number}", episode_folder_path="One Piece/1")
+    update_season(season, is_fully_scraped=True)
+    site.pages = season_site(4, descending=True)
+    scraper = ScraperHandler(ANIME_URL, max_workers=2, listing_mode=True)
+
+    episodes = scraper.scrape_episodes_of_season(season)
+
+    assert site.requested == [SEASON_URL]
+    assert len(episodes) == 12
+
+
+def test_failed_middle_page_is_fetched_again_on_the_next_crawl(site, season):
+    site.pages = season_site(6)
+    site.failing = {page_url(3)}
+    scraper = ScraperHandler(ANIME_URL, max_workers=2, listing_mode=True)
+    with pytest.raises(IncompleteSeasonError):
+        scraper.scrape_episodes_of_season(season)
+    assert not season.is_fully_scraped
+
+    # The newest pages are already scraped, but the crawl mustn't stop before page 3
+    site.failing.clear()
+    site.requested.clear()
+    episodes = scraper.scrape_episodes_of_season(season)
+
+    assert page_url(3) in site.requested
+    assert sorted(episode.episode_number for episode in episodes) == list(range(1, 19))
+    assert season.is_fully_scraped
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_paginator_without_last_page_link_is_followed_to_the_end(site, season, descending):
+    # Each paginator only shows the next 4 pages, like 1 ... 5 and "Next"
+    site.pages = season_site(12, descending=descending, window=4)
+    scraper = ScraperHandler(ANIME_URL, max_workers=2, listing_mode=True)
+
+    episodes = scraper.scrape_episodes_of_season(season)
+
+    assert sorted(episode.episode_number for episode in episodes) == list(range(1, 37))
+    assert sorted(site.requested) == sorted(set(site.requested))  # Every page is fetched once
+
+
+def detail_page(number):
+    """Build the detail page of an episode, with its information table and download button."""
+    rows = {
+        "File Name:": f"{number} Episode {number}.mp4",
+        "File Size:": "120 MB",
+        "Duration:": "23:40",
+        "File Format:": "mp4",
+        "Resolution:": "1280x720",
+    }
+    table = "".join(f'<tr><td class="desc_label">{label}</td><td class="desc_value">{value}</td></tr>'
+                    for label, value in rows.items())
+    return (f'<div class="Singamdasam text-center"><table>{table}</table>'
+            f'<a class="download-btn" href="/files/Season-1/{number} Episode {number}.mp4">Download</a></div>')
+
+
+def listing_site(linked_numbers, listed_numbers, files_per_episode=2):
+    """
+    Build a one-page season linking directly to the detail pages of `linked_numbers`, and to
+    a listing of `files_per_episode` files for each of `listed_numbers`, with their detail pages.
+    """
+    pages = {}
+    links = []
+    for number in linked_numbers:
+        links.append((episode_link(number), f"{number} Episode {number}.mp4"))
+        pages[episode_link(number)] = detail_page(number)
+    for number in listed_numbers:
+        listing_url = f"{ANIME_URL}Season-1-Episode-{number}/"
+        links.append((listing_url, f"Episode {number}"))
+        files = []
+        for quality in ["720p", "480p"][:files_per_episode]:
+            file_url = f"{listing_url}{number} Episode {number} {quality}.html"
+            files.append(f'<div class="Singamdasam"><a href="{file_url[6:]}">{number} Episode {number} {quality}.mp4</a>'
+                         f'<span>Size:</span> {120 if quality == "720p" else 60} MB</div>')
+            pages[file_url] = detail_page(number)
+        pages[listing_url] = "".join(files)
+
+    pages[SEASON_URL] = "".join(f'<div class="Singamdasam"><a href="{url[6:]}">{text}</a></div>' for url, text in links)
+    return pages
+
+
+def test_listing_mode_creates_episodes_from_listing_pages(site, season):
+    site.pages = listing_site(linked_numbers=[1, 2], listed_numbers=[3, 4])
+    scraper = ScraperHandler(ANIME_URL, listing_mode=True)
+
+    episodes = {episode.episode_number: episode for episode in scraper.scrape_episodes_of_season(season)}
+
+    # Only the season page and the file listings are fetched, no detail page
+    assert site.requested == [SEASON_URL, f"{ANIME_URL}Season-1-Episode-3/", f"{ANIME_URL}Season-1-Episode-4/"]
+    assert sorted(episodes) == [1, 2, 3, 4]
+    assert not any(episode.is_cached or episode.episode_url for episode in episodes.values())
+    assert (episodes[1].episode_name, episodes[1].episode_info_url) == ("Episode 1", episode_link(1))
+    # The first of the files listed for an episode is kept
+    assert (episodes[3].file_name, episodes[3].episode_size) == ("3 Episode 3 720p.mp4", "120 MB")
+    assert episodes[3].episode_info_url.endswith("3 Episode 3 720p.html")
+
+
+def test_resolve_episodes_fetches_the_details_and_drops_failed_pages(site, season):
+    site.pages = listing_site(linked_numbers=[1, 2], listed_numbers=[3, 4])
+    scraper = ScraperHandler(ANIME_URL, listing_mode=True)
+    episodes = scraper.scrape_episodes_of_season(season)
+    site.failing = {episode_link(2)}
+    site.requested.clear()
+
+    resolved = scraper.resolve_episodes(episodes)
+
+    assert len(site.requested) == 4
+    assert sorted(episode.episode_number for episode in resolved) == [1, 3, 4]
+    for episode in resolved:
+        assert episode.is_cached
+        assert episode.episode_url == f"https://eng.cartoonsarea.cc/files/Season-1/{episode.episode_number} Episode {episode.episode_number}.mp4"
+        assert (episode.duration, episode.resolution) == ("23:40", "1280x720")
+
+    # Resolved episodes aren't fetched again
+    site.failing.clear()
+    site.requested.clear()
+    assert len(scraper.resolve_episodes(episodes)) == 4
+    assert site.requested == [episode_link(2)]
+
+
+@pytest.mark.parametrize("files_per_episode", [1, 2])
+def test_listing_mode_halves_the_requests_of_a_full_crawl(site, season, files_per_episode):
+    site.pages = listing_site(linked_numbers=[1, 2], listed_numbers=range(3, 11), files_per_episode=files_per_episode)
+    ScraperHandler(ANIME_URL, listing_mode=False).scrape_episodes_of_season(season)
+    normal_requests = len(site.requested)
+
+    anime = add_anime("One Piece Listed", ANIME_URL + "Listed/")
+    listed_season = add_season(anime, 1, SEASON_URL, "One Piece Listed/1")
+    site.requested.clear()
+    episodes = ScraperHandler(ANIME_URL, listing_mode=True).scrape_episodes_of_season(listed_season)
+
+    assert len(episodes) == 10
+    assert len(site.requested) * 2 <= normal_requests
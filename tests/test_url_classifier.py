@@ -0,0 +1,59 @@
+import pytest
+
+from url_classifier import (
+    ANIME,
+    EPISODE,
+    EPISODE_LIST,
+    HOME,
+    SEASON,
+    UNKNOWN,
+    UrlInfo,
+    benchmark,
+    classify_url,
+)
+
+ANIME_URL = "https://eng.cartoonsarea.cc/English-Dubbed-Series/O-Dubbed-Series/One-Piece-Dubbed-Videos/"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://eng.cartoonsarea.cc/", UrlInfo(HOME, None, None, None)),
+    (ANIME_URL + "#gsc.tab=0", UrlInfo(ANIME, "One Piece", None, None)),
+    (ANIME_URL + "One-Piece-Season-2-Dubbed-Videos/", UrlInfo(SEASON, "One Piece", 2, None)),
+    (ANIME_URL + "One-Piece-Season-2-Dubbed-Videos/?page=3", UrlInfo(SEASON, "One Piece", 2, None)),
+    (ANIME_URL + "Season-2/62 Episode Name.html", UrlInfo(EPISODE, "One Piece", 2, 62)),
+    (ANIME_URL + "Season-2/62Episode Name.html", UrlInfo(EPISODE, "One Piece", 2, 62)),
+    (ANIME_URL + "Season-2/62!Episode.html", UrlInfo(EPISODE, "One Piece", 2, 62)),
+    (ANIME_URL + "Season-2-Episode-62/", UrlInfo(EPISODE_LIST, "One Piece", 2, 62)),
+    (ANIME_URL + "Season-2-Season-62/", UrlInfo(EPISODE_LIST, "One Piece", 2, 62)),
+    ("https://example.com/about", UrlInfo(UNKNOWN, None, None, None)),
+    ("", UrlInfo(UNKNOWN, None, None, None)),
+    (None, UrlInfo(UNKNOWN, None, None, None)),
+])
+def test_classify_url(url, expected):
+    assert classify_url(url) == expected
+
+
+def test_season_with_a_single_season_part_is_not_an_episode_list():
+    # 'Season-' once only matches the season rule, which comes after the episode list rule
+    assert classify_url(ANIME_URL + "One-Piece-Season-12-Dubbed-Videos/").kind == SEASON
+    assert classify_url(ANIME_URL + "Season-12/").kind == SEASON
+
+
+def test_episode_rule_comes_before_the_episode_list_rule():
+    assert classify_url(ANIME_URL + "Season-2-Episode-62/62 Episode Name.mp4") == UrlInfo(EPISODE, "One Piece", 2, 62)
+
+
+def test_results_are_memoized():
+    classify_url.cache_clear()
+    url = ANIME_URL + "Season-2-Episode-62/"
+
+    assert classify_url(url) is classify_url(url)
+    info = classify_url.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_throughput():
+    cold, warm = benchmark(count=20000)
+
+    assert cold >= 10000
+    assert warm >= cold
@@ -0,0 +1,99 @@
+import os
+import threading
+
+from peewee import OperationalError
+
+import worker
+from db_manager import add_anime, add_season, add_episode
+from job_store import DOWNLOAD_JOB, DONE, enqueue_job, claim_job
+from models import Episode, Job
+
+
+def enqueue_download():
+    anime = add_anime("One Piece", "https://eng.cartoonsarea.cc/One-Piece-Dubbed-Videos/")
+    season = add_season(anime, 1, "https://eng.cartoonsarea.cc/One-Piece-Season-1/", "One Piece/1")
+    episode = add_episode(season, 1, "Romance Dawn", "1 Romance Dawn.mp4")
+    enqueue_job(DOWNLOAD_JOB, episode.id)
+    return episode
+
+
+def test_heartbeat_retries_database_errors(database, monkeypatch):
+    enqueue_download()
+    job = claim_job("worker-1", lease_seconds=1)
+
+    calls = []
+    renew_lease = worker.renew_lease
+
+    def flaky_renew_lease(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OperationalError("database is locked")
+        return renew_lease(*args)
+
+    monkeypatch.setattr(worker, "renew_lease", flaky_renew_lease)
+    heartbeat = worker.Heartbeat(job, "worker-1", lease_seconds=1)
+    with heartbeat:
+        threading.Event().wait(0.6)
+
+    assert len(calls) >= 2
+    assert not heartbeat.lost.is_set()
+    assert Job.get_by_id(job.id).lease_expires_at > job.lease_expires_at
+
+
+def test_lost_lease_aborts_the_running_job(database):
+    enqueue_download()
+    job_worker = worker.Worker(worker_id="worker-1", lease_seconds=0.3)
+    aborted = []
+
+    def download(episode_id, abort):
+        # Another worker reclaims and finishes the job meanwhile
+        Job.update(worker_id="worker-2", status=DONE).execute()
+        aborted.append(abort.wait(2))
+
+    job_worker.handlers[DOWNLOAD_JOB] = download
+
+    assert job_worker.run(poll_interval=0, exit_when_idle=True) == 0
+    assert aborted == [True]
+    assert Job.get().worker_id == "worker-2"
+
+
+def test_downloaded_files_are_probed(database, tmp_path, monkeypatch):
+    import file_downloader
+
+    ffprobe_output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ffprobe_output.json")
+    (tmp_path / "ffprobe").write_text(f"#!/bin/sh\ncat '{ffprobe_output}'\n")
+    (tmp_path / "ffprobe").chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path), prepend=os.pathsep)
+
+    def download_file(self, episode, abort=None):
+        target_path = str(tmp_path / "1_Romance_Dawn.mp4")
+        open(target_path, "wb").close()
+        self.process_file(episode, target_path)
+        return True
+
+    monkeypatch.setattr(file_downloader.FileDownloader, "download_file", download_file)
+    episode = enqueue_download()
+
+    assert worker.Worker(worker_id="worker-1").run(poll_interval=0, exit_when_idle=True) == 1
+    episode = Episode.get_by_id(episode.id)
+    assert episode.is_processed
+    assert (episode.duration, episode.resolution) == ("0:00:02", "320x240")
+
+
+def test_season_job_preloads_the_anime(database, monkeypatch):
+    import scraper_handler
+    from db_manager import preloaded_anime_ids, get_episode_by_season_and_number
+
+    season = enqueue_download().season
+    scraped = []
+
+    def scrape_episodes_of_season(self, season_item):
+        assert season_item.anime_id in preloaded_anime_ids
+        scraped.append(get_episode_by_season_and_number(season_item, 1))
+        return []
+
+    monkeypatch.setattr(scraper_handler.ScraperHandler, "scrape_episodes_of_season", scrape_episodes_of_season)
+    worker.clear_cache()
+    worker.Worker().run_season_job(season.id, threading.Event())
+
+    assert [episode.episode_number for episode in scraped] == [1]
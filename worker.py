@@ -0,0 +1,301 @@
+import argparse
+import os
+import socket
+import threading
+import time
+
+from peewee import OperationalError
+
+from db_manager import (
+    db,
+    connect_db,
+    create_tables,
+    close_db,
+    clear_cache,
+    preload_anime,
+    get_season_by_anime_and_number,
+)
+from job_store import (
+    SEASON_JOB,
+    EPISODE_DETAILS_JOB,
+    DOWNLOAD_JOB,
+    set_journal_mode,
+    enqueue_job,
+    claim_job,
+    renew_lease,
+    complete_job,
+    fail_job,
+    count_jobs,
+    has_unfinished_jobs,
+)
+from models import Season, Episode
+
+# ScraperHandler and FileDownloader pull in requests, BeautifulSoup and tqdm, so they are
+# imported by the commands that need them, keeping quick commands like `status` fast.
+
+
+class Heartbeat(threading.Thread):
+    def __init__(self, job, worker_id, lease_seconds):
+        """
+        Keep renewing the lease of a job while it's being worked on, so that long
+        downloads aren't reclaimed by other workers. Database errors are retried until
+        the lease would have expired. Once the lease is lost, `lost` is set and the job
+        should stop, because another worker may be running it.
+
+        :param job: The Job model instance being worked on.
+        :param worker_id: ID of the worker holding the lease.
+        :param lease_seconds: Duration of the lease, renewed every third of it.
+        """
+        super().__init__(daemon=True)
+        self.job = job
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        renewed_at = time.monotonic()
+        interval = self.lease_seconds / 3
+        try:
+            while not self.stopped.wait(interval):
+                try:
+                    renewed = renew_lease(self.job, self.worker_id, self.lease_seconds)
+                except OperationalError as e:
+                    # E.g. the database stayed locked by other workers longer than the busy timeout
+                    if time.monotonic() - renewed_at < self.lease_seconds:
+                        print(f"Failed to renew the lease of {self.job}, retrying. Error: {e}")
+                        interval = self.lease_seconds / 10
+                        continue
+                    renewed = False
+
+                if not renewed:
+                    print(f"Lost the lease of {self.job}, aborting it.")
+                    self.lost.set()
+                    break
+                renewed_at = time.monotonic()
+                interval = self.lease_seconds / 3
+        finally:
+            db.close()  # Close this thread's connection
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.join()
+
+
+class Worker:
+    def __init__(self, worker_id=None, kinds=None, lease_seconds=300, max_attempts=3, max_workers=4, remux=False):
+        """
+        Initialize a worker that claims jobs from the shared job store and runs them.
+        Several workers can run at the same time, on this machine or, with the rollback
+        journal, on others sharing the database file.
+
+        :param worker_id: ID of the worker. Defaults to the host name and process ID.
+        :param kinds: (Optional) List of job kinds this worker handles. Defaults to all of them.
+        :param lease_seconds: How long a claimed job is reserved without a heartbeat.
+        :param max_attempts: Number of attempts after which a job is failed.
+        :param max_workers: Maximum number of pages fetched in parallel inside a job.
+        :param remux: If True, remux the downloaded files to MP4 before probing them.
+        """
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.kinds = kinds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_workers = max_workers
+        self.remux = remux
+        self.media_processor = None  # Probes the downloaded files while the worker runs
+        self.downloader = None  # Created by the first download job
+        self.handlers = {
+            SEASON_JOB: self.run_season_job,
+            EPISODE_DETAILS_JOB: self.run_episode_details_job,
+            DOWNLOAD_JOB: self.run_download_job,
+        }
+
+    def run(self, poll_interval=5, exit_when_idle=False):
+        """
+        Claim and run jobs until interrupted. Downloaded files are probed in the background
+        while the next jobs run.
+
+        :param poll_interval: Seconds to wait before polling again when there is no work.
+        :param exit_when_idle: If True, stop once no job is pending or running.
+        :return: The number of jobs completed by this worker.
+        """
+        from media_processor import MediaProcessor
+
+        self.media_processor = MediaProcessor(remux=self.remux)
+        with self.media_processor:
+            return self.run_jobs(poll_interval, exit_when_idle)
+
+    def run_jobs(self, poll_interval, exit_when_idle):
+        """Claim and run jobs, recording the media information of the processed files in between."""
+        completed = 0
+        while True:
+            self.media_processor.save_completed()
+
+            job = claim_job(self.worker_id, self.kinds, self.lease_seconds, self.max_attempts)
+            if job is None:
+                if exit_when_idle and not has_unfinished_jobs(self.kinds):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print(f"\nWorker {self.worker_id} claimed {job}.")
+            # Other workers may have changed the rows cached by the previous job
+            clear_cache()
+            error = None
+            with Heartbeat(job, self.worker_id, self.lease_seconds) as heartbeat:
+                try:
+                    self.handlers[job.kind](job.target_id, heartbeat.lost)
+                except Exception as e:
+                    error = e
+
+            if heartbeat.lost.is_set():
+                print(f"Abandoned {job}, its lease was lost.")
+            elif error is not None:
+                print(f"{job} failed: {error}")
+                fail_job(job, self.worker_id, error, self.max_attempts)
+            elif complete_job(job, self.worker_id):
+                completed += 1
+
+        return completed
+
+    def run_season_job(self, season_id, abort):
+        """
+        Scrape the pages of a season in listing mode, then enqueue a job to fetch the
+        details of each new episode, or to download it if its details are known. A whole
+        season is one job, since its pages are crawled newest-first and the crawl stops at
+        the first page that is already scraped.
+
+        :param season_id: ID of the season.
+        :param abort: Event set when the job has to stop.
+        """
+        from scraper_handler import ScraperHandler
+
+        season = Season.get_by_id(season_id)
+        # The identity map was cleared for this job, so the known episodes are loaded at once
+        preload_anime(season.anime)
+        season = get_season_by_anime_and_number(season.anime, season.season_number)
+        scraper = ScraperHandler(season.anime.anime_link, max_workers=self.max_workers, listing_mode=True)
+        episodes = scraper.scrape_episodes_of_season(season_item=season)
+        if abort.is_set():
+            return
+
+        for episode in episodes:
+            if episode.is_cached and episode.episode_url:
+                enqueue_job(DOWNLOAD_JOB, episode.id)
+            else:
+                enqueue_job(EPISODE_DETAILS_JOB, episode.id)
+
+    def run_episode_details_job(self, episode_id, abort):
+        """Fetch the detail page of an episode, then enqueue its download unless the job was aborted."""
+        from scraper_handler import ScraperHandler
+
+        episode = Episode.get_by_id(episode_id)
+        scraper = ScraperHandler(episode.season.anime.anime_link, max_workers=1)
+        if not scraper.resolve_episodes([episode]):
+            raise Exception(f"No download URL found for episode {episode.episode_number}.")
+        if abort.is_set():
+            return
+        enqueue_job(DOWNLOAD_JOB, episode.id)
+
+    def run_download_job(self, episode_id, abort):
+        """Download the file of an episode, stopping early if the job is aborted."""
+        if self.downloader is None:
+            from file_downloader import FileDownloader
+            self.downloader = FileDownloader(media_processor=self.media_processor)
+
+        episode = Episode.get_by_id(episode_id)
+        if not self.downloader.download_file(episode, abort=abort):
+            raise Exception(f"Download of episode {episode.episode_number} failed.")
+
+
+def enqueue_anime(anime_url, season_numbers=None):
+    """
+    Scrape the seasons of an anime and enqueue a job for each of them. Seasons that
+    were already scraped are set back to pending, so that new episodes are picked up.
+
+    :param anime_url: The URL of the anime.
+    :param season_numbers: (Optional) List of season numbers to enqueue. Defaults to all of them.
+    :return: The number of season jobs enqueued.
+    """
+    from scraper_handler import ScraperHandler
+
+    scraper = ScraperHandler(anime_url)
+    anime = scraper.get_anime_model_from_url()
+    seasons = scraper.scrap_seasons(anime_item=anime)
+
+    enqueued = 0
+    for season in seasons:
+        if season_numbers and season.season_number not in season_numbers:
+            continue
+        if enqueue_job(SEASON_JOB, season.id, refresh=True):
+            enqueued += 1
+    return enqueued
+
+
+def print_status():
+    """Print the number of jobs by kind and status."""
+    counts = count_jobs()
+    if not counts:
+        print("No jobs.")
+    for (kind, status), count in sorted(counts.items()):
+        print(f"{kind} | {status} | {count}")
+
+
+def get_arguments():
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description="Scrape and download anime with workers sharing a job store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Enqueue the seasons of an anime.")
+    enqueue_parser.add_argument("anime_url")
+    enqueue_parser.add_argument("--seasons", help="Comma-separated season numbers, e.g. 1,2,3. Defaults to all.")
+
+    run_parser = commands.add_parser("run", help="Claim and run jobs.")
+    run_parser.add_argument("--worker-id")
+    run_parser.add_argument("--kinds", help=f"Comma-separated job kinds: {SEASON_JOB}, {EPISODE_DETAILS_JOB}, {DOWNLOAD_JOB}.")
+    run_parser.add_argument("--lease-seconds", type=int, default=300)
+    run_parser.add_argument("--max-attempts", type=int, default=3)
+    run_parser.add_argument("--poll-interval", type=float, default=5)
+    run_parser.add_argument("--exit-when-idle", action="store_true", help="Stop once there is no work left.")
+    run_parser.add_argument("--remux", action="store_true", help="Remux the downloaded files to MP4 before probing them.")
+
+    commands.add_parser("status", help="Show the number of jobs by kind and status.")
+
+    parser.add_argument(
+        "--journal-mode", choices=["wal", "delete"],
+        help="Set the journal mode of the database. 'wal' is faster for workers on a single host, "
+             "workers on several hosts need 'delete'. Defaults to leaving it unchanged.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = get_arguments()
+
+    connect_db()
+    create_tables()
+    if arguments.journal_mode:
+        set_journal_mode(arguments.journal_mode)
+
+    if arguments.command == "enqueue":
+        season_numbers = [int(s.strip()) for s in arguments.seasons.split(",")] if arguments.seasons else None
+        print(f"\nEnqueued {enqueue_anime(arguments.anime_url, season_numbers)} seasons.")
+    elif arguments.command == "run":
+        worker = Worker(
+            worker_id=arguments.worker_id,
+            kinds=arguments.kinds.split(",") if arguments.kinds else None,
+            lease_seconds=arguments.lease_seconds,
+            max_attempts=arguments.max_attempts,
+            remux=arguments.remux,
+        )
+        completed = worker.run(poll_interval=arguments.poll_interval, exit_when_idle=arguments.exit_when_idle)
+        print(f"\nWorker {worker.worker_id} completed {completed} jobs.")
+    else:
+        print_status()
+
+    close_db()